@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import inspect
+import logging
+from typing import Any, Awaitable, Callable
+
+log = logging.getLogger(__name__)
+
+Handler = Callable[[Any], Awaitable[None] | None]
+
+# Topics published when process-local state changes in a way other workers must mirror.
+IDENTITY = "identity"  # payload: telegram_id
+IDENTITY_STUDENT = "identity_student"  # payload: student_id
+STUDENT = "student"  # payload: (student_id, first_name, last_name)
+REGISTRY = "registry"  # payload: None
+GRADES = "grades"  # payload: list of reloaded courses
+
+_handlers: dict[str, list[Handler]] = {}
+_sink: Callable[[str, Any], None] | None = None
+
+
+def publish(topic: str, payload: Any = None) -> None:
+    """Tell the other worker processes; a no-op when running as a single process."""
+    if _sink is not None:
+        _sink(topic, payload)
+
+
+def set_sink(sink: Callable[[str, Any], None] | None) -> None:
+    global _sink
+    _sink = sink
+
+
+def subscribe(topic: str, handler: Handler) -> None:
+    _handlers.setdefault(topic, []).append(handler)
+
+
+async def deliver(topic: str, payload: Any) -> None:
+    """Apply a change another worker published (never re-published)."""
+    for handler in _handlers.get(topic, ()):
+        try:
+            result = handler(payload)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            log.exception("Failed to apply %s event", topic)
@@ -12,3 +12,11 @@ class GradeCb(CallbackData, prefix="grade"):
 class AdminStudentCb(CallbackData, prefix="admstu"):
     student_id: str
     action: str  # grades / unlink / edit_name / back
+
+
+class AdminStatsCb(CallbackData, prefix="admstats"):
+    course: str
+
+
+class AdminBroadcastCb(CallbackData, prefix="admbc"):
+    action: str  # send / cancel
@@ -6,10 +6,67 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
     BOT_TOKEN: str
+    TELEGRAM_API_URL: str = ""  # e.g. a local Bot API server or a fake one for load tests
     DB_URL: str = "sqlite+aiosqlite:////data/bot.db"  # default for Fly Volume
     LOG_LEVEL: str = "INFO"
 
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # NORMAL is crash-safe in WAL mode; FULL also survives power loss
+    SQLITE_CACHE_KB: int = 16_384
+    DB_GROUP_COMMIT: bool = False
+    DB_GROUP_COMMIT_DELAY: float = 0.005
+    DB_GROUP_COMMIT_MAX_BATCH: int = 64
+
     OWNER_STUDENT_ID: str = "40211272003"
 
+    RUN_MODE: str = "polling"  # polling / webhook
+    # Polling and workers run one update per chat at a time, chats in parallel.
+    POLL_CONCURRENCY: int = 8  # updates in flight; below the DB pool, like WORKER_CONCURRENCY
+    CHAT_BACKLOG: int = 5  # updates waiting per chat; further ones are dropped
+    WORKERS: int = 1  # >1: one receiver process fans updates out to this many worker processes
+    # Updates in flight per worker. Keep it, like POLL_CONCURRENCY and WEBHOOK_MAX_CONCURRENCY,
+    # below the DB pool (5 + 10 overflow): each handler holds a pooled connection, and the
+    # outbox, grade watcher and group-commit writer need some of their own.
+    WORKER_CONCURRENCY: int = 8
+    WEBHOOK_BASE_URL: str = ""  # public https URL; set_webhook is skipped when empty
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+    WEBHOOK_MAX_CONCURRENCY: int = 8  # updates in flight; below the DB pool
+    WEBHOOK_DRAIN_TIMEOUT: float = 30.0
+
+    FSM_STORAGE: str = "sql"  # sql / memory
+    FSM_STATE_TTL: float = 7 * 24 * 3600
+    FSM_CACHE_SIZE: int = 10_000
+
+    GRADES_POLL_INTERVAL: float = 10.0
+    GRADE_NOTIFICATIONS: bool = True
+    GRADE_SCALE: float = 20.0  # a column's full mark unless its header declares one, e.g. "final (100)"
+    GRADE_PASS_RATIO: float = 0.5  # course stats count a pass at this share of the full mark
+
+    OUTBOX_RATE: float = 25.0  # msg/s across all chats, leaving headroom for direct replies
+    OUTBOX_CHAT_RATE: float = 1.0
+    OUTBOX_MAX_INFLIGHT: int = 8
+
+    # Per-user token buckets: (rate per second, burst). THROTTLE_* guards every update
+    # before the DB is touched; THROTTLE_LIMITS applies per router.
+    THROTTLE_RATE: float = 3.0
+    THROTTLE_BURST: int = 10
+    THROTTLE_LIMITS: dict[str, tuple[float, int]] = {
+        "registration": (0.5, 4),
+        "grades": (1.0, 5),
+        "admin": (5.0, 20),
+    }
+    THROTTLE_MAX_USERS: int = 50_000
+
+    IDENTITY_CACHE_SIZE: int = 10_000
+    IDENTITY_CACHE_TTL: float = 300.0
+
+    METRICS_PORT: int = 0  # 0: /metrics is served by the webhook server (webhook mode only)
+    METRICS_PATH: str = "/metrics"
+    METRICS_SLOW_QUERY_MS: float = 100.0
+    METRICS_N_PLUS_ONE: int = 10  # same statement this many times in one update gets logged
+
 
 settings = Settings()
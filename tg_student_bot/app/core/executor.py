@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Chat, TelegramObject, User
+
+from app.core.throttling import answer_dropped, throttle_stats
+
+log = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class ChatExecutor:
+    """Runs jobs in parallel across keys and strictly in order within one key.
+
+    Each busy key has a deque drained by its own task; the deque and task go away as
+    soon as it is empty, so idle chats cost nothing. At most ``concurrency`` jobs run
+    at once overall, and a key with ``backlog`` jobs already waiting drops new ones.
+    """
+
+    def __init__(self, concurrency: int, backlog: int):
+        self.backlog = backlog
+        self._limit = asyncio.Semaphore(concurrency)
+        self._queues: dict[Hashable, deque[Job]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(self, key: Hashable | None, job: Job) -> bool:
+        """Queue ``job`` behind earlier jobs for ``key``; False if it was dropped."""
+        if key is None:
+            self._spawn(self._run_one(job))
+            return True
+        q = self._queues.get(key)
+        if q is None:
+            q = self._queues[key] = deque([job])
+            self._spawn(self._drain(key, q))
+        elif len(q) > self.backlog:  # the head is running, the rest are waiting
+            return False
+        else:
+            q.append(job)
+        return True
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_one(self, job: Job) -> None:
+        async with self._limit:
+            try:
+                await job()
+            except Exception:
+                log.exception("Update processing failed")
+
+    async def _drain(self, key: Hashable, q: deque[Job]) -> None:
+        try:
+            while q:
+                await self._run_one(q[0])
+                q.popleft()
+        finally:
+            del self._queues[key]
+
+    async def drain(self, timeout: float) -> None:
+        """Wait for queued and running jobs, up to ``timeout`` seconds."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+        if self._tasks:
+            log.warning("%d chats still busy after %.0fs; abandoning their updates", len(self._tasks), timeout)
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """Outermost update middleware: hands the rest of the chain to a :class:`ChatExecutor`.
+
+    Updates are keyed by chat (by user for inline queries), so a double-tapped button or
+    a burst of messages is handled one at a time while other chats proceed. It returns
+    right away; the dispatcher must not wait for it (``handle_as_tasks=False``).
+
+    aiogram's FSM middleware runs before this one and reads the state when the update
+    is queued, so each job reads it again before the state filters see it. Updates
+    dropped for a full backlog count as ``chat_backlog`` in ``throttle_stats``, and
+    dropped button presses are still answered.
+    """
+
+    def __init__(self, executor: ChatExecutor):
+        self.executor = executor
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat: Chat | None = data.get("event_chat")
+        user: User | None = data.get("event_from_user")
+        key = chat.id if chat is not None else user.id if user is not None else None
+
+        async def job() -> Any:
+            state: FSMContext | None = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            return await handler(event, data)
+
+        if not self.executor.submit(key, job):
+            throttle_stats["chat_backlog"] += 1
+            await answer_dropped(event, data)
+        return None
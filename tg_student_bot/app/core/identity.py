@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True, slots=True)
+class Identity:
+    telegram_id: int
+    student_id: str | None
+    is_owner: bool
+
+    @property
+    def registered(self) -> bool:
+        return self.student_id is not None
+
+
+class IdentityCache:
+    """Bounded LRU of ``telegram_id -> Identity`` with a TTL per entry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._items: OrderedDict[int, tuple[float, Identity]] = OrderedDict()
+        self._by_student: dict[str, int] = {}
+
+    def get(self, telegram_id: int) -> Identity | None:
+        item = self._items.get(telegram_id)
+        if item is None:
+            return None
+        expires, ident = item
+        if expires < time.monotonic():
+            self._drop(telegram_id)
+            return None
+        self._items.move_to_end(telegram_id)
+        return ident
+
+    def put(self, ident: Identity, version: int | None = None) -> None:
+        # A lookup that raced with an invalidation must not resurrect stale data.
+        if version is not None and version != self.version:
+            return
+        self._drop(ident.telegram_id)
+        self._items[ident.telegram_id] = (time.monotonic() + self.ttl, ident)
+        if ident.student_id is not None:
+            self._by_student[ident.student_id] = ident.telegram_id
+        while len(self._items) > self.maxsize:
+            self._drop(next(iter(self._items)))
+
+    def invalidate(self, telegram_id: int) -> None:
+        self.version += 1
+        self._drop(telegram_id)
+
+    def invalidate_student(self, student_id: str) -> None:
+        self.version += 1
+        telegram_id = self._by_student.get(student_id)
+        if telegram_id is not None:
+            self._drop(telegram_id)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._items.clear()
+        self._by_student.clear()
+
+    def _drop(self, telegram_id: int) -> None:
+        item = self._items.pop(telegram_id, None)
+        if item is not None and item[1].student_id is not None:
+            if self._by_student.get(item[1].student_id) == telegram_id:
+                del self._by_student[item[1].student_id]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+identity_cache = IdentityCache(maxsize=settings.IDENTITY_CACHE_SIZE, ttl=settings.IDENTITY_CACHE_TTL)
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """Resolves the sender to an :class:`Identity` once per update (``data["identity"]``)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is not None:
+            ident = identity_cache.get(user.id)
+            if ident is None:
+                version = identity_cache.version
+                link = await data["link_repo"].get_link_by_telegram(user.id)
+                sid = link.student_id if link else None
+                ident = Identity(telegram_id=user.id, student_id=sid, is_owner=sid is not None and sid == data["owner_student_id"])
+                identity_cache.put(ident, version)
+            data["identity"] = ident
+        return await handler(event, data)
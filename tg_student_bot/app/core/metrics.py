@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import bisect
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.throttling import throttle_stats
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Histogram:
+    """Fixed-bucket histogram, cumulative on export like a Prometheus one."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (inf past the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+@dataclass
+class Metrics:
+    handler_latency: dict[tuple[str, str], Histogram] = field(default_factory=dict)
+    handler_outcomes: Counter[tuple[str, str, str]] = field(default_factory=Counter)
+    update_latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    update_queries: Histogram = field(default_factory=lambda: Histogram(COUNT_BUCKETS))
+    query_latency: Histogram = field(default_factory=lambda: Histogram(QUERY_BUCKETS))
+    queries: Counter[str] = field(default_factory=Counter)  # by scope: update / background
+    slow_queries: int = 0
+    n_plus_one: int = 0
+    # Extra values owned by other modules (sessions, outbox, ...), read at export time.
+    gauges: dict[str, Callable[[], float]] = field(default_factory=dict)
+
+
+metrics = Metrics()
+
+
+@dataclass(slots=True)
+class _UpdateScope:
+    update_id: int
+    handler: str = "-"
+    queries: int = 0
+    statements: Counter[str] = field(default_factory=Counter)
+
+
+_scope: contextvars.ContextVar[_UpdateScope | None] = contextvars.ContextVar("metrics_scope", default=None)
+
+
+def _compact(statement: str, limit: int = 200) -> str:
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + "…"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement, attribute it to the current update and log slow ones."""
+    slow = settings.METRICS_SLOW_QUERY_MS / 1000
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        metrics.query_latency.observe(elapsed)
+
+        scope = _scope.get()
+        if scope is None:
+            metrics.queries["background"] += 1
+        else:
+            metrics.queries["update"] += 1
+            scope.queries += 1
+            scope.statements[statement] += 1
+
+        if elapsed >= slow:
+            metrics.slow_queries += 1
+            where = f"update {scope.update_id} ({scope.handler})" if scope else "background"
+            log.warning("Slow query %.1f ms in %s: %s", elapsed * 1000, where, _compact(statement))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outermost update middleware: times the whole update and owns its query scope.
+
+    An update that runs the same statement ``METRICS_N_PLUS_ONE`` times or more is
+    flagged as a likely N+1 (a per-row query in a loop).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        scope = _UpdateScope(event.update_id)
+        token = _scope.set(scope)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.update_latency.observe(time.perf_counter() - started)
+            metrics.update_queries.observe(scope.queries)
+            _scope.reset(token)
+            for statement, n in scope.statements.items():
+                if n >= settings.METRICS_N_PLUS_ONE:
+                    metrics.n_plus_one += 1
+                    log.warning(
+                        "Possible N+1 in update %s (%s): %d× %s", scope.update_id, scope.handler, n, _compact(statement)
+                    )
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Router inner middleware: per-handler latency and ok/error counts."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        router = data["event_router"].name
+        name = data["handler"].callback.__name__
+        scope = _scope.get()
+        if scope is not None:
+            scope.handler = f"{router}.{name}"
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "ok"
+            return result
+        finally:
+            key = (router, name)
+            hist = metrics.handler_latency.get(key)
+            if hist is None:
+                hist = metrics.handler_latency[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(time.perf_counter() - started)
+            metrics.handler_outcomes[(router, name, outcome)] += 1
+
+
+def _labels(**labels: object) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _histogram(lines: list[str], name: str, hist: Histogram, **labels: object) -> None:
+    seen = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        seen += n
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {seen}")
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.count}')
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+
+def render() -> str:
+    """Everything in Prometheus text exposition format."""
+    lines = ["# TYPE bot_handler_seconds histogram"]
+    for (router, name), hist in sorted(metrics.handler_latency.items()):
+        _histogram(lines, "bot_handler_seconds", hist, router=router, handler=name)
+    lines.append("# TYPE bot_handler_total counter")
+    for (router, name, outcome), n in sorted(metrics.handler_outcomes.items()):
+        lines.append(f"bot_handler_total{_labels(router=router, handler=name, outcome=outcome)} {n}")
+
+    lines.append("# TYPE bot_update_seconds histogram")
+    _histogram(lines, "bot_update_seconds", metrics.update_latency)
+    lines.append("# TYPE bot_update_db_queries histogram")
+    _histogram(lines, "bot_update_db_queries", metrics.update_queries)
+    lines.append("# TYPE bot_db_query_seconds histogram")
+    _histogram(lines, "bot_db_query_seconds", metrics.query_latency)
+    lines.append("# TYPE bot_db_queries_total counter")
+    for scope, n in sorted(metrics.queries.items()):
+        lines.append(f"bot_db_queries_total{_labels(scope=scope)} {n}")
+    lines.append("# TYPE bot_db_slow_queries_total counter")
+    lines.append(f"bot_db_slow_queries_total {metrics.slow_queries}")
+    lines.append("# TYPE bot_db_n_plus_one_total counter")
+    lines.append(f"bot_db_n_plus_one_total {metrics.n_plus_one}")
+
+    lines.append("# TYPE bot_throttled_total counter")
+    for name, n in sorted(throttle_stats.items()):
+        lines.append(f"bot_throttled_total{_labels(layer=name)} {n}")
+    for name, read in sorted(metrics.gauges.items()):
+        lines.append(f"# TYPE bot_{name} gauge")
+        lines.append(f"bot_{name} {read()}")
+    return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:g}"
+
+
+def summary() -> str:
+    """The same numbers as :func:`render`, condensed for the admin /stats command."""
+    u = metrics.update_latency
+    lines = [
+        f"Updates: {u.count}, p50 ≤{_ms(u.quantile(0.5))} ms, p95 ≤{_ms(u.quantile(0.95))} ms",
+        f"DB queries/update: {metrics.update_queries.sum / u.count if u.count else 0:.2f}",
+        "",
+        "Handlers (ok/err, p50/p95 ms):",
+    ]
+    for (router, name), hist in sorted(metrics.handler_latency.items()):
+        ok = metrics.handler_outcomes[(router, name, "ok")]
+        err = metrics.handler_outcomes[(router, name, "error")]
+        lines.append(f"{router}.{name}: {ok}/{err}, ≤{_ms(hist.quantile(0.5))}/≤{_ms(hist.quantile(0.95))}")
+
+    q = metrics.query_latency
+    lines += [
+        "",
+        f"DB: {q.count} queries, p95 ≤{_ms(q.quantile(0.95))} ms, {metrics.slow_queries} slow, {metrics.n_plus_one} N+1",
+        "Throttled: " + (", ".join(f"{k} {v}" for k, v in sorted(throttle_stats.items())) or "0"),
+    ]
+    lines += [f"{name}: {read():g}" for name, read in sorted(metrics.gauges.items())]
+    return "\n".join(lines)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get(settings.METRICS_PATH, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    log.info("Metrics on %s:%s%s", host, port, settings.METRICS_PATH)
+    return runner
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import contextlib
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, TelegramObject, Update, User
+
+from app.utils.token_bucket import TokenBucket
+
+# Updates dropped so far, per middleware name.
+throttle_stats: Counter[str] = Counter()
+
+SLOW_DOWN = "لطفاً کمی صبر کنید."
+
+
+async def answer_dropped(event: TelegramObject, data: dict[str, Any]) -> None:
+    """Answer a dropped button press without touching the DB, so it stops spinning."""
+    call = event.callback_query if isinstance(event, Update) else event
+    if isinstance(call, CallbackQuery):
+        bot: Bot = data["bot"]
+        with contextlib.suppress(TelegramAPIError):
+            await bot.answer_callback_query(call.id, text=SLOW_DOWN)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Drops updates from users who exceed ``rate``/s (bursts up to ``burst``).
+
+    Buckets live in a bounded LRU, so idle users cost nothing after eviction. As an
+    update-level outer middleware it runs before any DB session is opened; as a router
+    (inner) middleware it only counts updates that router actually handles. Dropped
+    callback queries are still answered, without touching the DB, so the button stops
+    spinning.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_users: int = 50_000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+
+    def allow(self, user_id: int) -> bool:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket.take(time.monotonic()) == 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is not None and not self.allow(user.id):
+            throttle_stats[self.name] += 1
+            await answer_dropped(event, data)
+            return None
+        return await handler(event, data)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.core.config import settings
+from app.core.metrics import metrics_handler
+
+log = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Acks every update immediately and processes at most ``max_concurrency`` at a time.
+
+    On shutdown, in-flight (and queued) updates are drained before the bot session closes.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, drain_timeout: float, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._drain_timeout = drain_timeout
+        self._inflight: set[asyncio.Task[Any]] = set()
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        try:
+            async with self._semaphore:
+                await super()._background_feed_update(bot, update)
+        except Exception:
+            log.exception("Failed to process update %s", update.get("update_id"))
+        finally:
+            self._inflight.discard(task)
+
+    async def drain(self) -> None:
+        if not self._inflight:
+            return
+        log.info("Draining %d in-flight updates", len(self._inflight))
+        _, pending = await asyncio.wait(set(self._inflight), timeout=self._drain_timeout)
+        if pending:
+            log.warning("Cancelling %d updates still running after %.0fs", len(pending), self._drain_timeout)
+            for task in pending:
+                task.cancel()
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+def build_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrency=settings.WEBHOOK_MAX_CONCURRENCY,
+        drain_timeout=settings.WEBHOOK_DRAIN_TIMEOUT,
+        secret_token=settings.WEBHOOK_SECRET or None,
+    )
+    handler.register(app, path=settings.WEBHOOK_PATH)
+    if not settings.METRICS_PORT:
+        app.router.add_get(settings.METRICS_PATH, metrics_handler)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    await serve_webhook(build_app(dp, bot), bot, dp.resolve_used_update_types())
+
+
+async def serve_webhook(app: web.Application, bot: Bot, allowed_updates: list[str]) -> None:
+    """Serve ``app`` on WEBAPP_HOST:WEBAPP_PORT (registering the webhook if public) until cancelled."""
+    if not settings.WEBHOOK_SECRET:
+        log.warning("WEBHOOK_SECRET is not set; webhook requests are not authenticated")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBAPP_HOST, port=settings.WEBAPP_PORT)
+    await site.start()
+    log.info("Webhook server listening on %s:%s%s", settings.WEBAPP_HOST, settings.WEBAPP_PORT, settings.WEBHOOK_PATH)
+
+    # Without a public URL the server only accepts local POSTs (handy for replaying updates).
+    if settings.WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            allowed_updates=allowed_updates,
+        )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -1,5 +1,14 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
 
 class Base(DeclarativeBase):
     pass
+
+
+def dialect_insert(bind: AsyncSession | AsyncConnection | AsyncEngine, table):
+    """Dialect-specific INSERT supporting ``on_conflict_do_update``."""
+    if getattr(bind, "bind", bind).dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.db.base import dialect_insert
+from app.db.models import FsmData, FsmState
+from app.db.session import current_session
+
+_MISSING = object()
+# key -> (entry as last persisted, entry now) for writes held back by SQLStorage.batch().
+_pending: contextvars.ContextVar[dict[str, tuple["_Entry", "_Entry"]] | None] = contextvars.ContextVar(
+    "fsm_pending", default=None
+)
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+@dataclass
+class _Entry:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    touched_at: float = 0.0
+
+
+class SQLStorage(BaseStorage):
+    """FSM storage persisted in ``fsm_states``/``fsm_data`` with a write-through LRU cache.
+
+    Data is stored one row per field, so only the fields that changed are written.
+    Inside :meth:`batch` (one per update) changes are held back and written as one
+    transaction per key at the end, so ``clear()`` or a state change plus data costs a
+    single write; outside it every call is at most one transaction. Reads are served
+    from the cache once a key has been loaded. Keys idle for longer than ``ttl`` read
+    as empty and are removed by :meth:`purge_expired`.
+
+    While an update's session is current, reads and writes use its connection
+    instead of taking a second one from the pool.
+    """
+
+    def __init__(self, engine: AsyncEngine, ttl: float, cache_size: int = 10_000):
+        self._engine = engine
+        self._ttl = ttl
+        self._cache_size = cache_size
+        self._cache: OrderedDict[str, _Entry] = OrderedDict()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id or key.business_connection_id or key.destiny != "default":
+            parts += [str(key.thread_id or ""), key.business_connection_id or "", key.destiny]
+        return ":".join(parts)
+
+    def _remember(self, k: str, entry: _Entry) -> None:
+        self._cache[k] = entry
+        self._cache.move_to_end(k)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return entry.touched_at and entry.touched_at + self._ttl < now
+
+    @contextlib.asynccontextmanager
+    async def _connect(self, write: bool) -> AsyncIterator[AsyncConnection]:
+        session = current_session.get()
+        if session is None:
+            async with self._engine.begin() if write else self._engine.connect() as conn:
+                yield conn
+            return
+        yield await session.connection()
+        if write:
+            await session.commit()
+
+    async def _load(self, k: str) -> _Entry:
+        now = time.time()
+        entry = self._cache.get(k)
+        if entry is None:
+            async with self._connect(write=False) as conn:
+                row = (await conn.execute(select(FsmState.state, FsmState.touched_at).where(FsmState.key == k))).first()
+                entry = _Entry()
+                if row is not None:
+                    entry.state, entry.touched_at = row.state, row.touched_at
+                    fields = await conn.execute(select(FsmData.field, FsmData.value).where(FsmData.key == k))
+                    entry.data = {f: json.loads(v) for f, v in fields}
+        if self._expired(entry, now):
+            await self._save(k, entry, _Entry())
+            return _Entry()
+        self._remember(k, entry)
+        return entry
+
+    async def _save(self, k: str, old: _Entry, new: _Entry) -> None:
+        """Cache ``new`` and persist the difference from ``old``, now or at the end of the batch."""
+        new.touched_at = time.time()
+        self._remember(k, new)
+        pending = _pending.get()
+        if pending is None:
+            await self._persist(k, old, new)
+        else:
+            pending[k] = (pending[k][0] if k in pending else old, new)
+
+    async def _persist(self, k: str, old: _Entry, new: _Entry) -> None:
+        drop = new.state is None and not new.data
+        if drop and old.state is None and not old.data:
+            return  # never stored, or already removed
+        upserts = {f: v for f, v in new.data.items() if old.data.get(f, _MISSING) != v}
+        removed = [f for f in old.data if f not in new.data]
+        try:
+            async with self._connect(write=True) as conn:
+                if drop:
+                    await conn.execute(delete(FsmData).where(FsmData.key == k))
+                    await conn.execute(delete(FsmState).where(FsmState.key == k))
+                    return
+                if removed:
+                    await conn.execute(delete(FsmData).where(FsmData.key == k, FsmData.field.in_(removed)))
+                if upserts:
+                    stmt = dialect_insert(conn, FsmData)
+                    stmt = stmt.on_conflict_do_update(index_elements=[FsmData.key, FsmData.field], set_={"value": stmt.excluded.value})
+                    await conn.execute(stmt, [{"key": k, "field": f, "value": _encode(v)} for f, v in upserts.items()])
+                stmt = dialect_insert(conn, FsmState).values(key=k, state=new.state, touched_at=new.touched_at)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[FsmState.key], set_={"state": new.state, "touched_at": new.touched_at}
+                )
+                await conn.execute(stmt)
+        except Exception:
+            self._cache.pop(k, None)  # reload what was actually stored next time
+            raise
+
+    @contextlib.asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        """Hold back writes made inside the block and persist each key once when it ends."""
+        pending: dict[str, tuple[_Entry, _Entry]] = {}
+        token = _pending.set(pending)
+        try:
+            yield
+        finally:
+            _pending.reset(token)
+            for k, (old, new) in pending.items():
+                await self._persist(k, old, new)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        entry = await self._load(k)
+        new_state = state.state if isinstance(state, State) else state
+        if new_state != entry.state:
+            await self._save(k, entry, _Entry(new_state, entry.data))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k = self._key(key)
+        entry = await self._load(k)
+        new_data = dict(data)
+        if new_data != entry.data:
+            await self._save(k, entry, _Entry(entry.state, new_data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._load(self._key(key))).data)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        k = self._key(key)
+        entry = await self._load(k)
+        new_data = {**entry.data, **data}
+        if new_data != entry.data:
+            await self._save(k, entry, _Entry(entry.state, new_data))
+        return dict(new_data)
+
+    async def purge_expired(self) -> None:
+        cutoff = time.time() - self._ttl
+        async with self._engine.begin() as conn:
+            stale = select(FsmState.key).where(FsmState.touched_at < cutoff)
+            await conn.execute(delete(FsmData).where(FsmData.key.in_(stale)))
+            await conn.execute(delete(FsmState).where(FsmState.touched_at < cutoff))
+        for k in [k for k, e in self._cache.items() if e.touched_at and e.touched_at < cutoff]:
+            del self._cache[k]
+
+    async def close(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+
+from sqlalchemy import delete, select
+
+from app.core import bus
+from app.db.base import dialect_insert
+from app.db.models import GradeColumn, GradeCourse, GradeRow, GradeValue
+from app.db.session import SessionLocal
+from app.utils.csv_loader import STAT_INTERVAL, GradeTable, course_signature, list_courses, read_grade_table
+from app.utils.persian import normalize_digits
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_checked_at = 0.0
+_signatures: dict[str, tuple[int, int]] = {}
+
+# Held by the grade watcher around each sync and by an upload from before it reads the
+# old rows until it has synced, so the upload's diff isn't against rows the watcher
+# already ingested from the new file.
+ingest_lock = asyncio.Lock()
+
+
+def _row_hash(columns: list[str], cells: list[str]) -> str:
+    payload = "\x1f".join(f"{c}\x1e{v}" for c, v in zip(columns, cells) if v)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+async def _load_course(course: str, table: GradeTable) -> set[str] | None:
+    """Replace one course's rows in a single transaction.
+
+    Returns the students whose row is new or changed, or None if the file hash is unchanged.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            stored = await session.scalar(select(GradeCourse.file_hash).where(GradeCourse.course == course))
+            if stored == table.digest:
+                return None
+
+            old_hashes = dict((await session.execute(
+                select(GradeRow.student_id, GradeRow.row_hash).where(GradeRow.course == course)
+            )).tuples().all())
+            new_hashes = {sid: _row_hash(table.columns, cells) for sid, cells in table.rows.items()}
+            changed = {sid for sid, h in new_hashes.items() if old_hashes.get(sid) != h}
+
+            await session.execute(delete(GradeValue).where(GradeValue.course == course))
+            await session.execute(delete(GradeColumn).where(GradeColumn.course == course))
+            await session.execute(delete(GradeRow).where(GradeRow.course == course))
+
+            stmt = dialect_insert(session, GradeCourse).values(course=course, file_hash=table.digest)
+            stmt = stmt.on_conflict_do_update(index_elements=[GradeCourse.course], set_={"file_hash": table.digest})
+            await session.execute(stmt)
+
+            if table.columns:
+                await session.execute(
+                    GradeColumn.__table__.insert(),
+                    [{"course": course, "position": i, "name": name} for i, name in enumerate(table.columns)],
+                )
+
+            batch = []
+            for sid, cells in table.rows.items():
+                for i, cell in enumerate(cells):
+                    if cell:
+                        batch.append({"course": course, "student_id": sid, "position": i, "value": normalize_digits(cell)})
+                if len(batch) >= BATCH_SIZE:
+                    await session.execute(GradeValue.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                await session.execute(GradeValue.__table__.insert(), batch)
+
+            hashes = [{"course": course, "student_id": sid, "row_hash": h} for sid, h in new_hashes.items()]
+            for i in range(0, len(hashes), BATCH_SIZE):
+                await session.execute(GradeRow.__table__.insert(), hashes[i:i + BATCH_SIZE])
+
+    log.info("Ingested grades for %s: %d students, %d changed", course, len(table.rows), len(changed))
+    return changed
+
+
+async def _drop_course(course: str) -> None:
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(delete(GradeValue).where(GradeValue.course == course))
+            await session.execute(delete(GradeColumn).where(GradeColumn.course == course))
+            await session.execute(delete(GradeRow).where(GradeRow.course == course))
+            await session.execute(delete(GradeCourse).where(GradeCourse.course == course))
+    log.info("Removed grades for %s", course)
+
+
+async def sync_grades(force: bool = False) -> dict[str, set[str]]:
+    """Bring the grade tables in line with ``data/grades``.
+
+    Returns ``{course: changed student ids}`` for every course that was (re)loaded.
+    Files whose stat() signature is unchanged are not read, and files whose content
+    hash matches the stored one are read but not written.
+    """
+    global _checked_at
+
+    now = time.monotonic()
+    if not force and now - _checked_at < STAT_INTERVAL:
+        return {}
+    _checked_at = now
+
+    courses = await list_courses(force=force)
+    if force:
+        _signatures.clear()
+        async with SessionLocal() as session:
+            stored = set((await session.execute(select(GradeCourse.course))).scalars().all())
+    else:
+        stored = set(_signatures)
+
+    dropped = stored - set(courses)
+    for course in dropped:
+        await _drop_course(course)
+        _signatures.pop(course, None)
+
+    loaded: dict[str, set[str]] = {}
+    for course in courses:
+        sig = await course_signature(course)
+        if sig is None or _signatures.get(course) == sig:
+            continue
+        table = await read_grade_table(course)
+        if table is None:
+            log.warning("Skipping grades/%s.csv: no student_id column", course)
+        else:
+            changed = await _load_course(course, table)
+            if changed is not None:
+                loaded[course] = changed
+        _signatures[course] = sig
+    if loaded or dropped:
+        bus.publish(bus.GRADES, sorted(loaded.keys() | dropped))
+    return loaded
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Connection, DateTime, Float, ForeignKey, Index, Integer, MetaData, SmallInteger,
+    String, Table, Text, UniqueConstraint, func, inspect, insert, select, text,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+log = logging.getLogger(__name__)
+
+Migration = Callable[[Connection], None]
+
+# The schema as of version 1, frozen here so that what a step creates never changes with
+# app.db.models. Later schema changes go in their own appended step, not in here.
+_v1 = MetaData()
+
+
+def _timestamp(name: str, onupdate: bool = True) -> Column:
+    return Column(
+        name, DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now() if onupdate else None
+    )
+
+
+Table(
+    "student_registry", _v1,
+    Column("student_id", String(32), primary_key=True),
+    Column("first_name", String(128), nullable=False),
+    Column("last_name", String(128), nullable=False),
+    _timestamp("created_at"), _timestamp("updated_at"),
+    Index("ix_student_registry_order", "last_name", "first_name", "student_id"),
+)
+Table(
+    "user_links", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("telegram_id", BigInteger, nullable=False),
+    Column("student_id", String(32), ForeignKey("student_registry.student_id"), nullable=False),
+    Column("confirmed", Boolean, nullable=False),
+    _timestamp("created_at"), _timestamp("updated_at"),
+    UniqueConstraint("telegram_id", name="uq_user_links_telegram_id"),
+    UniqueConstraint("student_id", name="uq_user_links_student_id"),
+)
+Table(
+    "auth_attempts", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("telegram_id", BigInteger, nullable=False),
+    Column("failures", Integer, nullable=False),
+    Column("locked", Boolean, nullable=False),
+    _timestamp("updated_at"),
+    UniqueConstraint("telegram_id", name="uq_auth_attempts_telegram_id"),
+)
+schema_version = Table(
+    "schema_version", _v1,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(64), nullable=False),
+    _timestamp("applied_at", onupdate=False),
+)
+Table(
+    "sync_state", _v1,
+    Column("key", String(64), primary_key=True),
+    Column("value", String(128), nullable=False),
+    _timestamp("updated_at"),
+)
+Table(
+    "fsm_states", _v1,
+    Column("key", String(128), primary_key=True),
+    Column("state", String(128), nullable=True),
+    Column("touched_at", Float, nullable=False, index=True),
+)
+Table(
+    "fsm_data", _v1,
+    Column("key", String(128), primary_key=True),
+    Column("field", String(64), primary_key=True),
+    Column("value", Text, nullable=False),
+)
+Table(
+    "grade_courses", _v1,
+    Column("course", String(128), primary_key=True),
+    Column("file_hash", String(64), nullable=False),
+    _timestamp("updated_at"),
+)
+Table(
+    "grade_columns", _v1,
+    Column("course", String(128), ForeignKey("grade_courses.course"), primary_key=True),
+    Column("position", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+)
+Table(
+    "grade_rows", _v1,
+    Column("course", String(128), primary_key=True),
+    Column("student_id", String(32), primary_key=True),
+    Column("row_hash", String(16), nullable=False),
+)
+Table(
+    "grade_values", _v1,
+    Column("course", String(128), primary_key=True),
+    Column("student_id", String(32), primary_key=True),
+    Column("position", Integer, primary_key=True),
+    Column("value", String(255), nullable=False),
+    Index("ix_grade_values_student", "student_id", "course", "position"),
+)
+Table(
+    "broadcasts", _v1,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("text", Text, nullable=False),
+    Column("requested_by", BigInteger, nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("total", Integer, nullable=False),
+    Column("sent", Integer, nullable=False),
+    Column("failed", Integer, nullable=False),
+    _timestamp("created_at"), _timestamp("updated_at"),
+)
+Table(
+    "broadcast_recipients", _v1,
+    Column("broadcast_id", Integer, ForeignKey("broadcasts.id"), primary_key=True),
+    Column("telegram_id", BigInteger, primary_key=True),
+    Column("status", SmallInteger, nullable=False),
+)
+
+
+def _create_tables(conn: Connection) -> None:
+    """Create the version 1 tables that are missing (all of them, on a new database)."""
+    _v1.create_all(conn)
+
+
+def _add_indexes(conn: Connection) -> None:
+    """Add the version 1 indexes to tables that predate versioning and so were skipped above."""
+    for table in ("student_registry", "grade_values", "fsm_states"):
+        for index in _v1.tables[table].indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _widen_telegram_ids(conn: Connection) -> None:
+    """Telegram ids no longer fit in 32 bits (SQLite INTEGER is already 64-bit)."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in ("user_links", "auth_attempts"):
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN telegram_id TYPE BIGINT"))
+
+
+# Append only: a step's position is its version number.
+MIGRATIONS: list[Migration] = [
+    _create_tables,
+    _add_indexes,
+    _widen_telegram_ids,
+]
+
+
+def _current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.scalar(select(func.max(schema_version.c.version))) or 0
+
+
+async def migrate(engine: AsyncEngine) -> int:
+    """Apply pending migrations, each in its own transaction; returns the schema version.
+
+    A database that is already current costs one catalog lookup and one SELECT.
+    """
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_version)
+
+    for version, step in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(step)
+            await conn.execute(insert(schema_version).values(version=version, name=step.__name__.lstrip("_")))
+        log.info("Applied migration %d (%s)", version, step.__name__.lstrip("_"))
+        current = version
+    return current
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, DateTime, Boolean, UniqueConstraint, func, ForeignKey
+from sqlalchemy import String, Integer, BigInteger, SmallInteger, DateTime, Boolean, Float, Text, UniqueConstraint, Index, func, ForeignKey
 from app.db.base import Base
 
 
 class StudentRegistry(Base):
     __tablename__ = "student_registry"
+    __table_args__ = (Index("ix_student_registry_order", "last_name", "first_name", "student_id"),)
 
     student_id: Mapped[str] = mapped_column(String(32), primary_key=True)
     first_name: Mapped[str] = mapped_column(String(128), nullable=False)
@@ -24,7 +25,7 @@ class UserLink(Base):
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     student_id: Mapped[str] = mapped_column(String(32), ForeignKey("student_registry.student_id"), nullable=False)
 
     confirmed: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
@@ -38,8 +39,100 @@ class AuthAttempt(Base):
     __table_args__ = (UniqueConstraint("telegram_id", name="uq_auth_attempts_telegram_id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     failures: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     locked: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
 
     updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    applied_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(128), nullable=False)
+
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class FsmState(Base):
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(128), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    touched_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+
+
+class FsmData(Base):
+    __tablename__ = "fsm_data"
+
+    key: Mapped[str] = mapped_column(String(128), primary_key=True)
+    field: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class GradeCourse(Base):
+    __tablename__ = "grade_courses"
+
+    course: Mapped[str] = mapped_column(String(128), primary_key=True)
+    file_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class GradeColumn(Base):
+    __tablename__ = "grade_columns"
+
+    course: Mapped[str] = mapped_column(String(128), ForeignKey("grade_courses.course"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+
+
+class GradeRow(Base):
+    __tablename__ = "grade_rows"
+
+    course: Mapped[str] = mapped_column(String(128), primary_key=True)
+    student_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    row_hash: Mapped[str] = mapped_column(String(16), nullable=False)
+
+
+class GradeValue(Base):
+    __tablename__ = "grade_values"
+    __table_args__ = (Index("ix_grade_values_student", "student_id", "course", "position"),)
+
+    course: Mapped[str] = mapped_column(String(128), primary_key=True)
+    student_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), nullable=False)
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    requested_by: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="running")  # running / done
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = "broadcast_recipients"
+
+    broadcast_id: Mapped[int] = mapped_column(Integer, ForeignKey("broadcasts.id"), primary_key=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)  # 0 pending / 1 sent / 2 failed
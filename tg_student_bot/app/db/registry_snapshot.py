@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import bisect
+import math
+from array import array
+from typing import Iterable
+
+from sqlalchemy import select
+
+from app.db.models import StudentRegistry
+from app.db.session import SessionLocal
+
+_MASK = (1 << 64) - 1
+
+
+class StudentName:
+    __slots__ = ("first_name", "last_name")
+
+    def __init__(self, first_name: str, last_name: str):
+        self.first_name = first_name
+        self.last_name = last_name
+
+
+class _Bloom:
+    """Bloom filter over 64-bit ids: ~1% false positives at 10 bits and 5 probes per id."""
+
+    __slots__ = ("bits", "size")
+    PROBES = 5
+
+    def __init__(self, capacity: int):
+        self.size = max(64, capacity * 10)
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _probes(self, key: int):
+        h1 = (key * 0x9E3779B97F4A7C15) & _MASK
+        h2 = (((key ^ (key >> 31)) * 0xBF58476D1CE4E5B9) & _MASK) | 1
+        for i in range(self.PROBES):
+            yield ((h1 + i * h2) & _MASK) % self.size
+
+    def add(self, key: int) -> None:
+        for bit in self._probes(key):
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.bits[bit >> 3] & (1 << (bit & 7)) for bit in self._probes(key))
+
+
+def _numeric(student_id: str) -> int | None:
+    if student_id.isascii() and student_id.isdigit() and student_id[0] != "0":
+        key = int(student_id)
+        if key <= _MASK:
+            return key
+    return None
+
+
+class RegistrySnapshot:
+    """Read-only copy of ``student_registry`` for registration lookups.
+
+    Numeric ids sit in a sorted ``array('Q')`` with a parallel list of slotted name
+    records, behind a Bloom filter so most unknown ids are turned away without a
+    search. Ids that don't fit a uint64 (leading zeros, letters) go in a small dict.
+    """
+
+    def __init__(self) -> None:
+        self._ids = array("Q")
+        self._names: list[StudentName] = []
+        self._other: dict[str, StudentName] = {}
+        self._filter = _Bloom(0)
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._other)
+
+    def load(self, rows: Iterable[tuple[str, str, str]]) -> None:
+        numeric: list[tuple[int, StudentName]] = []
+        other: dict[str, StudentName] = {}
+        for sid, fn, ln in rows:
+            key = _numeric(sid)
+            if key is None:
+                other[sid] = StudentName(fn, ln)
+            else:
+                numeric.append((key, StudentName(fn, ln)))
+        numeric.sort(key=lambda item: item[0])
+
+        self._ids = array("Q", (key for key, _ in numeric))
+        self._names = [name for _, name in numeric]
+        self._other = other
+        # Sized with headroom so admin additions don't push false positives up much.
+        self._filter = _Bloom(len(numeric) + len(numeric) // 4)
+        for key in self._ids:
+            self._filter.add(key)
+
+    def get(self, student_id: str) -> StudentName | None:
+        key = _numeric(student_id)
+        if key is None:
+            return self._other.get(student_id)
+        if key not in self._filter:
+            return None
+        i = bisect.bisect_left(self._ids, key)
+        if i < len(self._ids) and self._ids[i] == key:
+            return self._names[i]
+        return None
+
+    def __contains__(self, student_id: str) -> bool:
+        return self.get(student_id) is not None
+
+    def put(self, student_id: str, first_name: str, last_name: str) -> None:
+        key = _numeric(student_id)
+        if key is None:
+            self._other[student_id] = StudentName(first_name, last_name)
+            return
+        i = bisect.bisect_left(self._ids, key)
+        if i < len(self._ids) and self._ids[i] == key:
+            self._names[i] = StudentName(first_name, last_name)
+            return
+        self._ids.insert(i, key)
+        self._names.insert(i, StudentName(first_name, last_name))
+        self._filter.add(key)
+
+
+registry_snapshot = RegistrySnapshot()
+
+
+async def load_registry_snapshot() -> int:
+    async with SessionLocal() as session:
+        rows = (await session.execute(
+            select(StudentRegistry.student_id, StudentRegistry.first_name, StudentRegistry.last_name)
+        )).tuples().all()
+    registry_snapshot.load(rows)
+    return len(rows)
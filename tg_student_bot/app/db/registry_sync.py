@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Collection
+
+from sqlalchemy import delete, func, or_, select
+
+from app.core import bus
+from app.core.identity import identity_cache
+from app.db.base import dialect_insert
+from app.db.models import StudentRegistry, SyncState, UserLink
+from app.db.registry_snapshot import load_registry_snapshot
+from app.db.session import SessionLocal
+from app.db.student_index import load_student_index
+from app.utils.csv_loader import STAT_INTERVAL, read_registry_rows, registry_digest, registry_signature
+from app.utils.persian import normalize_student_id
+
+log = logging.getLogger(__name__)
+
+REGISTRY_KEY = "registry"
+BATCH_SIZE = 500
+
+_checked_at = 0.0
+_synced_signature: tuple[int, int] | None = None
+
+
+def _registry_batches(registry: list[dict[str, str]]):
+    # Later rows win, like the old row-by-row upsert; a multi-row upsert
+    # must not touch the same key twice.
+    rows: dict[str, dict[str, str]] = {}
+    for row in registry:
+        sid = normalize_student_id(row.get("student_id", ""))
+        fn = row.get("first_name", "")
+        ln = row.get("last_name", "")
+        if sid and fn and ln:
+            rows[sid] = {"student_id": sid, "first_name": fn, "last_name": ln}
+    values = list(rows.values())
+    for i in range(0, len(values), BATCH_SIZE):
+        yield values[i:i + BATCH_SIZE]
+
+
+async def sync_registry(force: bool = False, remove: Collection[str] = ()) -> bool:
+    """Upsert ``students.csv`` into ``student_registry`` if its content changed.
+
+    The common case is a cached stat() comparison and no DB work at all. Students in
+    ``remove`` (an upload's dropped rows) are deleted in the same transaction, along
+    with their links; a file on disk alone never deletes anyone. Returns True when
+    rows were written.
+    """
+    global _checked_at, _synced_signature
+
+    now = time.monotonic()
+    if not force and now - _checked_at < STAT_INTERVAL:
+        return False
+    _checked_at = now
+
+    sig = await registry_signature()
+    if sig is None or (not force and sig == _synced_signature):
+        return False
+
+    digest = await registry_digest()
+    written = False
+    async with SessionLocal() as session:
+        async with session.begin():
+            stored = await session.scalar(select(SyncState.value).where(SyncState.key == REGISTRY_KEY))
+            if stored != digest:
+                stmt = dialect_insert(session, StudentRegistry)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[StudentRegistry.student_id],
+                    set_={
+                        "first_name": stmt.excluded.first_name,
+                        "last_name": stmt.excluded.last_name,
+                        "updated_at": func.now(),
+                    },
+                    where=or_(
+                        StudentRegistry.first_name != stmt.excluded.first_name,
+                        StudentRegistry.last_name != stmt.excluded.last_name,
+                    ),
+                )
+                count = 0
+                for batch in _registry_batches(await read_registry_rows()):
+                    await session.execute(stmt, batch)
+                    count += len(batch)
+
+                state = dialect_insert(session, SyncState).values(key=REGISTRY_KEY, value=digest)
+                state = state.on_conflict_do_update(index_elements=[SyncState.key], set_={"value": digest})
+                await session.execute(state)
+                written = True
+                log.info("Registry synced: %d rows (sha256 %s)", count, digest[:12])
+
+            removed = sorted(remove)
+            for i in range(0, len(removed), BATCH_SIZE):
+                batch = removed[i:i + BATCH_SIZE]
+                await session.execute(delete(UserLink).where(UserLink.student_id.in_(batch)))
+                await session.execute(delete(StudentRegistry).where(StudentRegistry.student_id.in_(batch)))
+            if removed:
+                written = True
+                log.info("Registry: removed %d students", len(removed))
+
+    for student_id in remove:
+        identity_cache.invalidate_student(student_id)
+        bus.publish(bus.IDENTITY_STUDENT, student_id)
+
+    _synced_signature = sig
+    if written:
+        await load_student_index()
+        await load_registry_snapshot()
+        bus.publish(bus.REGISTRY)
+    return written
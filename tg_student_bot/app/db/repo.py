@@ -1,8 +1,26 @@
 from __future__ import annotations
 
-from sqlalchemy import select, delete, update
+from dataclasses import dataclass
+
+from sqlalchemy import select, delete, update, tuple_, func, literal, BigInteger, String
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.models import StudentRegistry, UserLink, AuthAttempt
+from app.db.base import dialect_insert
+from app.db.models import StudentRegistry, UserLink, AuthAttempt, GradeCourse, GradeColumn, GradeValue
+from app.core import bus
+from app.core.identity import identity_cache
+from app.db.registry_snapshot import registry_snapshot
+from app.db.session import write_queue
+from app.db.student_index import student_index
+from app.db.write_queue import WriteOp, T
+
+
+async def _write(session: AsyncSession, op: WriteOp[T]) -> T:
+    """Run a write either through the group-commit queue or on ``session`` with its own COMMIT."""
+    if write_queue is not None:
+        return await write_queue.submit(op)
+    result = await op(session)
+    await session.commit()
+    return result
 
 
 class StudentRepo:
@@ -10,14 +28,19 @@ class StudentRepo:
         self.session = session
 
     async def upsert_student(self, student_id: str, first_name: str, last_name: str) -> None:
-        q = await self.session.execute(select(StudentRegistry).where(StudentRegistry.student_id == student_id))
-        s = q.scalar_one_or_none()
-        if s is None:
-            self.session.add(StudentRegistry(student_id=student_id, first_name=first_name, last_name=last_name))
-        else:
-            s.first_name = first_name
-            s.last_name = last_name
-        await self.session.commit()
+        async def op(session: AsyncSession) -> None:
+            q = await session.execute(select(StudentRegistry).where(StudentRegistry.student_id == student_id))
+            s = q.scalar_one_or_none()
+            if s is None:
+                session.add(StudentRegistry(student_id=student_id, first_name=first_name, last_name=last_name))
+            else:
+                s.first_name = first_name
+                s.last_name = last_name
+
+        await _write(self.session, op)
+        student_index.put(student_id, first_name, last_name)
+        registry_snapshot.put(student_id, first_name, last_name)
+        bus.publish(bus.STUDENT, (student_id, first_name, last_name))
 
     async def get_student(self, student_id: str) -> StudentRegistry | None:
         q = await self.session.execute(select(StudentRegistry).where(StudentRegistry.student_id == student_id))
@@ -27,13 +50,41 @@ class StudentRepo:
         q = await self.session.execute(select(StudentRegistry).order_by(StudentRegistry.last_name, StudentRegistry.first_name))
         return list(q.scalars().all())
 
+    async def page_students(self, cursor: list[str] | None, direction: str = "next", limit: int = 12) -> tuple[list[StudentRegistry], bool]:
+        """Keyset page ordered by (last_name, first_name, student_id).
+
+        ``direction`` is ``next`` (after ``cursor``) or ``prev`` (before it). The flag
+        tells whether more rows exist beyond the page in that direction.
+        """
+        order = (StudentRegistry.last_name, StudentRegistry.first_name, StudentRegistry.student_id)
+        q = select(StudentRegistry)
+        if direction == "prev":
+            if cursor is not None:
+                q = q.where(tuple_(*order) < tuple_(*cursor))
+            q = q.order_by(*(c.desc() for c in order))
+        else:
+            if cursor is not None:
+                q = q.where(tuple_(*order) > tuple_(*cursor))
+            q = q.order_by(*order)
+        rows = list((await self.session.execute(q.limit(limit + 1))).scalars().all())
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == "prev":
+            rows.reverse()
+        return rows, more
+
     async def update_name(self, student_id: str, first_name: str, last_name: str) -> None:
-        await self.session.execute(
-            update(StudentRegistry)
-            .where(StudentRegistry.student_id == student_id)
-            .values(first_name=first_name, last_name=last_name)
-        )
-        await self.session.commit()
+        async def op(session: AsyncSession) -> None:
+            await session.execute(
+                update(StudentRegistry)
+                .where(StudentRegistry.student_id == student_id)
+                .values(first_name=first_name, last_name=last_name)
+            )
+
+        await _write(self.session, op)
+        student_index.put(student_id, first_name, last_name)
+        registry_snapshot.put(student_id, first_name, last_name)
+        bus.publish(bus.STUDENT, (student_id, first_name, last_name))
 
 
 class LinkRepo:
@@ -49,39 +100,143 @@ class LinkRepo:
         return q.scalar_one_or_none()
 
     async def create_link(self, telegram_id: int, student_id: str) -> None:
-        self.session.add(UserLink(telegram_id=telegram_id, student_id=student_id, confirmed=True))
-        await self.session.commit()
+        async def op(session: AsyncSession) -> None:
+            session.add(UserLink(telegram_id=telegram_id, student_id=student_id, confirmed=True))
+
+        await _write(self.session, op)
+        identity_cache.invalidate(telegram_id)
+        bus.publish(bus.IDENTITY, telegram_id)
+
+    async def count_links(self) -> int:
+        return await self.session.scalar(select(func.count()).select_from(UserLink))
+
+    async def telegram_ids_for(self, student_ids: list[str]) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for i in range(0, len(student_ids), 500):
+            q = await self.session.execute(
+                select(UserLink.student_id, UserLink.telegram_id).where(UserLink.student_id.in_(student_ids[i:i + 500]))
+            )
+            out.update(q.tuples().all())
+        return out
 
     async def unlink_student(self, student_id: str) -> None:
-        await self.session.execute(delete(UserLink).where(UserLink.student_id == student_id))
-        await self.session.commit()
+        async def op(session: AsyncSession) -> None:
+            await session.execute(delete(UserLink).where(UserLink.student_id == student_id))
+
+        await _write(self.session, op)
+        identity_cache.invalidate_student(student_id)
+        bus.publish(bus.IDENTITY_STUDENT, student_id)
 
 
 class AttemptRepo:
+    """Each method is one ``INSERT ... ON CONFLICT DO UPDATE`` so counts stay right under concurrency."""
+
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    @staticmethod
+    def _upsert(session: AsyncSession, telegram_id: int, failures, locked, set_: dict, where=None):
+        stmt = dialect_insert(session, AuthAttempt).values(telegram_id=telegram_id, failures=failures, locked=locked)
+        return stmt.on_conflict_do_update(
+            index_elements=[AuthAttempt.telegram_id], set_={**set_, "updated_at": func.now()}, where=where
+        )
+
     async def get_or_create(self, telegram_id: int) -> AuthAttempt:
-        q = await self.session.execute(select(AuthAttempt).where(AuthAttempt.telegram_id == telegram_id))
-        a = q.scalar_one_or_none()
-        if a is None:
-            a = AuthAttempt(telegram_id=telegram_id, failures=0, locked=False)
-            self.session.add(a)
-            await self.session.commit()
-        return a
-
-    async def increment_failure(self, telegram_id: int, max_failures: int = 3) -> AuthAttempt:
-        a = await self.get_or_create(telegram_id)
-        if a.locked:
-            return a
-        a.failures += 1
-        if a.failures >= max_failures:
-            a.locked = True
-        await self.session.commit()
-        return a
+        async def op(session: AsyncSession) -> AuthAttempt:
+            # A no-op update so RETURNING yields the existing row too.
+            stmt = self._upsert(session, telegram_id, 0, False, {"telegram_id": AuthAttempt.telegram_id})
+            return await session.scalar(stmt.returning(AuthAttempt), execution_options={"populate_existing": True})
+
+        return await _write(self.session, op)
+
+    async def increment_failure(self, telegram_id: int, max_failures: int = 3) -> AuthAttempt | None:
+        """Count one failed try; ``None`` if the user was already locked (nothing changes then)."""
+        async def op(session: AsyncSession) -> AuthAttempt | None:
+            stmt = self._upsert(session, telegram_id, 1, 1 >= max_failures, {
+                "failures": AuthAttempt.failures + 1,
+                "locked": AuthAttempt.failures + 1 >= max_failures,
+            }, where=~AuthAttempt.locked)
+            return await session.scalar(stmt.returning(AuthAttempt), execution_options={"populate_existing": True})
+
+        return await _write(self.session, op)
 
     async def reset(self, telegram_id: int) -> None:
-        a = await self.get_or_create(telegram_id)
-        a.failures = 0
-        a.locked = False
-        await self.session.commit()
+        async def op(session: AsyncSession) -> None:
+            await session.execute(self._upsert(session, telegram_id, 0, False, {"failures": 0, "locked": False}))
+
+        await _write(self.session, op)
+
+
+@dataclass(frozen=True, slots=True)
+class RegistrationCheck:
+    linked: bool
+    failures: int
+    locked: bool
+
+
+class RegistrationRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def check(self, telegram_id: int, student_id: str) -> RegistrationCheck:
+        """Link status and attempt state for one registration try, in one query.
+
+        Whether the student exists, and their name, comes from the registry snapshot.
+        """
+        p = select(
+            literal(telegram_id, BigInteger).label("telegram_id"),
+            literal(student_id, String).label("student_id"),
+        ).subquery("p")
+        q = await self.session.execute(
+            select(UserLink.id, AuthAttempt.failures, AuthAttempt.locked)
+            .select_from(p)
+            .outerjoin(UserLink, UserLink.student_id == p.c.student_id)
+            .outerjoin(AuthAttempt, AuthAttempt.telegram_id == p.c.telegram_id)
+        )
+        link_id, failures, locked = q.one()
+        return RegistrationCheck(link_id is not None, failures or 0, bool(locked))
+
+    async def record_failure(self, telegram_id: int, max_failures: int = 3) -> AuthAttempt | None:
+        return await AttemptRepo(self.session).increment_failure(telegram_id, max_failures)
+
+
+class GradeRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_courses(self) -> list[str]:
+        q = await self.session.execute(select(GradeCourse.course).order_by(GradeCourse.course))
+        return list(q.scalars().all())
+
+    async def course_hash(self, course: str) -> str | None:
+        return await self.session.scalar(select(GradeCourse.file_hash).where(GradeCourse.course == course))
+
+    async def course_values(self, course: str) -> tuple[list[str], list[tuple[int, str]]]:
+        """Column names and every (position, value) cell of one course."""
+        names = await self.session.execute(
+            select(GradeColumn.name).where(GradeColumn.course == course).order_by(GradeColumn.position)
+        )
+        cells = await self.session.execute(
+            select(GradeValue.position, GradeValue.value).where(GradeValue.course == course)
+        )
+        return list(names.scalars().all()), list(cells.tuples().all())
+
+    def _grades_query(self):
+        return (
+            select(GradeValue.course, GradeColumn.name, GradeValue.value)
+            .join(GradeColumn, (GradeColumn.course == GradeValue.course) & (GradeColumn.position == GradeValue.position))
+            .order_by(GradeValue.course, GradeValue.position)
+        )
+
+    async def get_grades(self, course: str, student_id: str) -> list[tuple[str, str]]:
+        q = await self.session.execute(
+            self._grades_query().where(GradeValue.course == course, GradeValue.student_id == student_id)
+        )
+        return [(name, value) for _, name, value in q.all()]
+
+    async def get_student_grades(self, student_id: str) -> dict[str, list[tuple[str, str]]]:
+        q = await self.session.execute(self._grades_query().where(GradeValue.student_id == student_id))
+        out: dict[str, list[tuple[str, str]]] = {}
+        for course, name, value in q.all():
+            out.setdefault(course, []).append((name, value))
+        return out
@@ -1,5 +1,70 @@
+from __future__ import annotations
+
+import contextvars
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.db.write_queue import WriteQueue
 
 engine = create_async_engine(settings.DB_URL, echo=False, future=True)
 SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record) -> None:
+        # WAL lets readers run alongside the single writer; busy_timeout makes
+        # writers wait for the lock instead of failing with "database is locked".
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_KB)}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+
+instrument_engine(engine)
+
+# Optional group commit for small repo writes (see WriteQueue).
+write_queue = (
+    WriteQueue(SessionLocal, max_delay=settings.DB_GROUP_COMMIT_DELAY, max_batch=settings.DB_GROUP_COMMIT_MAX_BATCH)
+    if settings.DB_GROUP_COMMIT
+    else None
+)
+
+
+@dataclass
+class SessionStats:
+    updates: int = 0
+    opened: int = 0
+
+
+session_stats = SessionStats()
+
+
+class LazySession:
+    """Stands in for an AsyncSession and only creates one on first use."""
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession] = SessionLocal):
+        self._factory = factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+# The session of the update being handled, for code that isn't handed one (FSM storage).
+current_session: contextvars.ContextVar[LazySession | None] = contextvars.ContextVar("current_session", default=None)
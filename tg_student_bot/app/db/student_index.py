@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import bisect
+from array import array
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import select
+
+from app.db.models import StudentRegistry
+from app.db.session import SessionLocal
+from app.utils.persian import normalize_search
+
+
+class StudentHit(NamedTuple):
+    student_id: str
+    first_name: str
+    last_name: str
+
+
+def _trigrams(term: str) -> set[str]:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def _terms(haystack: str) -> tuple[str, ...]:
+    return tuple(dict.fromkeys(haystack.split()))
+
+
+class StudentIndex:
+    """In-memory search over the registry by student id and name.
+
+    Each student gets an int slot. Every term (the id and each name word, normalized
+    with ``normalize_search``) sits in a sorted list with a parallel slot array for
+    prefix lookups, and each trigram maps to a sorted ``array('I')`` of slots for
+    substring lookups. Equal terms share one string. A query matches when each of its
+    words occurs in the student's id or name; prefix matches on the first word come
+    first, and both passes stop once ``limit`` hits are found.
+    """
+
+    def __init__(self) -> None:
+        self._slots: dict[str, int] = {}
+        self._hits: list[StudentHit | None] = []
+        self._haystacks: list[str] = []
+        self._free: list[int] = []
+        self._terms: list[str] = []  # sorted
+        self._term_slots = array("I")  # slot of each entry in _terms
+        self._trigrams: dict[str, array] = {}
+        self._strings: dict[str, str] = {}  # one copy of each distinct term
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _shared(self, term: str, student_id: str) -> str:
+        # Ids are unique, so they reuse the hit's string rather than filling the dict.
+        return student_id if term == student_id else self._strings.setdefault(term, term)
+
+    def load(self, rows: Iterable[tuple[str, str, str]]) -> None:
+        self.__init__()
+        entries: list[tuple[str, int]] = []
+        postings: dict[str, list[int]] = {}
+        for sid, fn, ln in rows:
+            if sid in self._slots:
+                continue
+            slot = self._slots[sid] = len(self._hits)
+            self._hits.append(StudentHit(sid, fn, ln))
+            haystack = normalize_search(f"{sid} {fn} {ln}")
+            self._haystacks.append(haystack)
+            for term in _terms(haystack):
+                term = self._shared(term, sid)
+                entries.append((term, slot))
+                for tri in _trigrams(term):
+                    postings.setdefault(tri, []).append(slot)  # slots ascend, so already sorted
+        entries.sort()
+        self._terms = [term for term, _ in entries]
+        self._term_slots = array("I", (slot for _, slot in entries))
+        self._trigrams = {tri: array("I", slots) for tri, slots in postings.items()}
+
+    def put(self, student_id: str, first_name: str, last_name: str) -> None:
+        self.remove(student_id)
+        slot = self._free.pop() if self._free else len(self._hits)
+        if slot == len(self._hits):
+            self._hits.append(None)
+            self._haystacks.append("")
+        self._slots[student_id] = slot
+        self._hits[slot] = StudentHit(student_id, first_name, last_name)
+        haystack = self._haystacks[slot] = normalize_search(f"{student_id} {first_name} {last_name}")
+        for term in _terms(haystack):
+            term = self._shared(term, student_id)
+            i = bisect.bisect_right(self._terms, term)
+            self._terms.insert(i, term)
+            self._term_slots.insert(i, slot)
+            for tri in _trigrams(term):
+                slots = self._trigrams.setdefault(tri, array("I"))
+                slots.insert(bisect.bisect_left(slots, slot), slot)
+
+    def remove(self, student_id: str) -> None:
+        slot = self._slots.pop(student_id, None)
+        if slot is None:
+            return
+        for term in _terms(self._haystacks[slot]):
+            i = bisect.bisect_left(self._terms, term)
+            while i < len(self._terms) and self._terms[i] == term:
+                if self._term_slots[i] == slot:
+                    del self._terms[i]
+                    del self._term_slots[i]
+                    break
+                i += 1
+            for tri in _trigrams(term):
+                slots = self._trigrams.get(tri)
+                if slots is None:
+                    continue
+                j = bisect.bisect_left(slots, slot)
+                if j < len(slots) and slots[j] == slot:
+                    del slots[j]
+                if not slots:
+                    del self._trigrams[tri]
+        self._hits[slot] = None
+        self._haystacks[slot] = ""
+        self._free.append(slot)
+
+    def search(self, query: str, limit: int = 20) -> list[StudentHit]:
+        words = normalize_search(query).split()
+        if not words:
+            return []
+        first = words[0]
+        found: dict[int, StudentHit] = {}
+
+        i = bisect.bisect_left(self._terms, first)
+        while i < len(self._terms) and len(found) < limit:
+            if not self._terms[i].startswith(first):
+                break
+            slot = self._term_slots[i]
+            haystack = self._haystacks[slot]
+            if slot not in found and all(w in haystack for w in words[1:]):
+                found[slot] = self._hits[slot]
+            i += 1
+
+        # Substring matches anywhere in the id or name: walk the rarest trigram of the
+        # longest word and check each candidate's text, until ``limit`` hits.
+        longest = max(words, key=len)
+        if len(found) < limit and len(longest) >= 3:
+            rarest = min((self._trigrams.get(tri, ()) for tri in _trigrams(longest)), key=len)
+            for slot in rarest:
+                haystack = self._haystacks[slot]
+                if slot not in found and all(w in haystack for w in words):
+                    found[slot] = self._hits[slot]
+                    if len(found) >= limit:
+                        break
+        return list(found.values())
+
+
+student_index = StudentIndex()
+
+
+async def load_student_index() -> int:
+    async with SessionLocal() as session:
+        rows = (await session.execute(
+            select(StudentRegistry.student_id, StudentRegistry.first_name, StudentRegistry.last_name)
+        )).tuples().all()
+    student_index.load(rows)
+    return len(rows)
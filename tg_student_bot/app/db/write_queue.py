@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteQueue:
+    """Single writer that folds concurrent small writes into one COMMIT.
+
+    ``submit`` resolves only after the transaction holding the op has committed. Ops
+    get a shared session and must not commit themselves. If a batch fails, it is
+    rolled back and its ops are retried one by one, so one bad write only fails its
+    own caller.
+    """
+
+    def __init__(self, factory: async_sessionmaker[AsyncSession], max_delay: float, max_batch: int):
+        self._factory = factory
+        self._max_delay = max_delay
+        self._max_batch = max_batch
+        self._pending: list[tuple[WriteOp[Any], asyncio.Future[Any]]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+        self.batches = 0
+        self.writes = 0
+
+    async def submit(self, op: WriteOp[T]) -> T:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            # A fresh context: the writer outlives the update whose write started it.
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+        self._wakeup.set()
+        if len(self._pending) >= self._max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            try:
+                # Give concurrent writers a moment to join this commit.
+                await asyncio.wait_for(self._full.wait(), self._max_delay)
+            except asyncio.TimeoutError:
+                pass
+            batch = self._pending[:self._max_batch]
+            del self._pending[:self._max_batch]
+            if not self._pending:
+                self._wakeup.clear()
+            if len(self._pending) < self._max_batch:
+                self._full.clear()
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch: list[tuple[WriteOp[Any], asyncio.Future[Any]]]) -> None:
+        try:
+            async with self._factory() as session:
+                results = [await op(session) for op, _ in batch]
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                future = batch[0][1]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            log.warning("Group commit of %d writes failed; retrying them one by one", len(batch))
+            for item in batch:
+                await self._commit([item])
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
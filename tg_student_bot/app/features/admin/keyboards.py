@@ -2,28 +2,27 @@ from __future__ import annotations
 
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
-from app.core.callbacks import AdminStudentCb
+from app.core.callbacks import AdminBroadcastCb, AdminStatsCb, AdminStudentCb
 
 
 def admin_menu_kb() -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardBuilder()
-    kb.row(KeyboardButton(text="Students"))
+    kb.row(KeyboardButton(text="Students"), KeyboardButton(text="Broadcast"))
+    kb.row(KeyboardButton(text="Course Stats"))
     kb.row(KeyboardButton(text="Back"))
     return kb.as_markup(resize_keyboard=True)
 
 
-def students_page_kb(students: list[tuple[str, str]], page: int, page_size: int = 12) -> ReplyKeyboardMarkup:
+def students_page_kb(students: list[tuple[str, str]], has_prev: bool, has_next: bool) -> ReplyKeyboardMarkup:
     kb = ReplyKeyboardBuilder()
-    start = page * page_size
-    end = start + page_size
 
-    for sid, label in students[start:end]:
+    for sid, label in students:
         kb.row(KeyboardButton(text=label))
 
     nav_row = []
-    if page > 0:
+    if has_prev:
         nav_row.append(KeyboardButton(text="Prev"))
-    if end < len(students):
+    if has_next:
         nav_row.append(KeyboardButton(text="Next"))
     if nav_row:
         kb.row(*nav_row)
@@ -40,3 +39,19 @@ def student_actions_kb(student_id: str) -> InlineKeyboardMarkup:
     kb.button(text="Back", callback_data=AdminStudentCb(student_id=student_id, action="back").pack())
     kb.adjust(2)
     return kb.as_markup()
+
+
+def broadcast_confirm_kb() -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✅ ارسال", callback_data=AdminBroadcastCb(action="send").pack())
+    kb.button(text="❌ لغو", callback_data=AdminBroadcastCb(action="cancel").pack())
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+def course_stats_kb(courses: list[str]) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for course in courses:
+        kb.button(text=course, callback_data=AdminStatsCb(course=course).pack())
+    kb.adjust(2)
+    return kb.as_markup()
@@ -1,29 +1,131 @@
 from __future__ import annotations
 
-from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 from aiogram.fsm.context import FSMContext
 
+from app.core.config import settings
 from app.core.guards import IsOwner
-from app.db.repo import StudentRepo, LinkRepo
-from app.features.admin.keyboards import admin_menu_kb, students_page_kb, student_actions_kb
+from app.core.metrics import summary
+from app.core.throttling import ThrottlingMiddleware
+from app.db.repo import StudentRepo, LinkRepo, GradeRepo
+from app.db.student_index import student_index
+from app.features.admin.keyboards import admin_menu_kb, broadcast_confirm_kb, students_page_kb, student_actions_kb, course_stats_kb
 from app.features.admin.states import AdminStates
-from app.utils.csv_loader import list_courses, get_grade
-from app.core.callbacks import AdminStudentCb
+from app.features.grades.texts import format_all_grades, format_course_stats
+from app.core.callbacks import AdminBroadcastCb, AdminStatsCb, AdminStudentCb
+from app.services.broadcast import start_broadcast
+from app.services.csv_import import ImportReport, UploadError, import_document
+from app.services.grade_stats import course_stats
+from app.services.outbox import Outbox
 
 router = Router(name="admin")
 
+_throttle = ThrottlingMiddleware("admin", *settings.THROTTLE_LIMITS["admin"], max_users=settings.THROTTLE_MAX_USERS)
+router.message.middleware(_throttle)
+router.callback_query.middleware(_throttle)
+router.inline_query.middleware(_throttle)
+
+PAGE_SIZE = 12
+SEARCH_LIMIT = 20
+
 
 def _student_label(student_id: str, first_name: str, last_name: str) -> str:
     return f"{student_id} - {first_name} {last_name}"
 
 
+def _import_text(report: ImportReport) -> str:
+    lines = [
+        f"✅ {report.target} imported in {report.seconds:.2f}s",
+        f"Inserted: {report.inserted}, updated: {report.updated}, unchanged: {report.unchanged}",
+        f"Rejected: {report.rejected}" + (f", removed: {report.removed}" if report.removed else ""),
+    ]
+    return "\n".join(lines + report.samples)
+
+
+async def _show_students_page(message: Message, state: FSMContext, student_repo: StudentRepo, cursor: list[str] | None, direction: str) -> None:
+    if cursor is None:
+        direction = "next"
+    students, more = await student_repo.page_students(cursor, direction, PAGE_SIZE)
+    if not students:
+        await message.answer("No More Students.")
+        return
+
+    if direction == "prev":
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    first, last = students[0], students[-1]
+    # Only the page bounds live in FSM data; each page turn is one indexed query.
+    await state.update_data(
+        page_first=[first.last_name, first.first_name, first.student_id],
+        page_last=[last.last_name, last.first_name, last.student_id],
+    )
+    packed = [(s.student_id, _student_label(s.student_id, s.first_name, s.last_name)) for s in students]
+    await message.answer("Students List:", reply_markup=students_page_kb(packed, has_prev=has_prev, has_next=has_next))
+
+
 @router.message(Command("admin"), IsOwner())
-async def cmd_admin(message: Message) -> None:
+async def cmd_admin(message: Message, state: FSMContext) -> None:
+    await state.clear()
     await message.answer("Admin Panel", reply_markup=admin_menu_kb())
 
 
+@router.message(Command("stats"), IsOwner())
+async def cmd_stats(message: Message) -> None:
+    await message.answer(f"📊 Stats\n\n{summary()}")
+
+
+@router.message(Command("find"), IsOwner())
+async def cmd_find(message: Message, command: CommandObject, state: FSMContext) -> None:
+    if not command.args:
+        await message.answer("Usage: /find <student id or name>")
+        return
+
+    hits = student_index.search(command.args, limit=SEARCH_LIMIT)
+    if not hits:
+        await message.answer("No Student Found.")
+        return
+
+    # Same buttons as the paged list, so picking one opens the student. An earlier page's
+    # bounds would make Next/Prev continue from it, so they go.
+    await state.set_state(AdminStates.browsing_students)
+    data = await state.get_data()
+    await state.set_data({k: v for k, v in data.items() if k not in ("page_first", "page_last")})
+    packed = [(h.student_id, _student_label(*h)) for h in hits]
+    await message.answer(f"Found {len(hits)}:", reply_markup=students_page_kb(packed, has_prev=False, has_next=False))
+
+
+@router.inline_query(IsOwner())
+async def inline_find(query: InlineQuery) -> None:
+    hits = student_index.search(query.query, limit=SEARCH_LIMIT) if query.query.strip() else []
+    await query.answer(
+        [
+            InlineQueryResultArticle(
+                id=h.student_id,
+                title=f"{h.first_name} {h.last_name}",
+                description=h.student_id,
+                input_message_content=InputTextMessageContent(message_text=_student_label(*h)),
+            )
+            for h in hits
+        ],
+        cache_time=5,
+        is_personal=True,
+    )
+
+
+@router.message(F.document, IsOwner())
+async def on_document(message: Message, bot: Bot, outbox: Outbox) -> None:
+    try:
+        report = await import_document(bot, message.document, outbox)
+    except UploadError as e:
+        await message.answer(f"❌ {e}")
+        return
+    await message.answer(_import_text(report))
+
+
 @router.message(F.text == "Back", IsOwner())
 async def admin_back(message: Message, state: FSMContext) -> None:
     await state.clear()
@@ -32,29 +134,80 @@ async def admin_back(message: Message, state: FSMContext) -> None:
 
 @router.message(F.text == "Students", IsOwner())
 async def admin_students(message: Message, state: FSMContext, student_repo: StudentRepo) -> None:
-    students = await student_repo.list_students()
-    packed = [(s.student_id, _student_label(s.student_id, s.first_name, s.last_name)) for s in students]
-    await state.update_data(students=packed, page=0)
     await state.set_state(AdminStates.browsing_students)
-    await message.answer("Students List:", reply_markup=students_page_kb(packed, page=0))
+    await _show_students_page(message, state, student_repo, cursor=None, direction="next")
+
+
+@router.message(F.text == "Broadcast", IsOwner())
+async def admin_broadcast(message: Message, state: FSMContext) -> None:
+    await state.set_state(AdminStates.broadcast_text)
+    await message.answer("متن پیام همگانی را بفرست (یا Back):")
+
+
+@router.message(F.text == "Course Stats", IsOwner())
+async def admin_course_stats(message: Message, state: FSMContext, grade_repo: GradeRepo) -> None:
+    await state.clear()
+    courses = await grade_repo.list_courses()
+    if not courses:
+        await message.answer("هیچ فایل نمره‌ای موجود نیست.")
+        return
+    await message.answer("Course:", reply_markup=course_stats_kb(courses))
+
+
+@router.callback_query(AdminStatsCb.filter(), IsOwner())
+async def on_course_stats(call: CallbackQuery, callback_data: AdminStatsCb, grade_repo: GradeRepo) -> None:
+    stats = await course_stats(grade_repo, callback_data.course)
+    if stats is None:
+        await call.message.answer("Course Not Found.")
+    else:
+        await call.message.answer(format_course_stats(stats))
+    await call.answer()
+
+
+@router.message(AdminStates.broadcast_text, IsOwner())
+async def admin_broadcast_text(message: Message, state: FSMContext, link_repo: LinkRepo) -> None:
+    text = (message.text or "").strip()
+    if not text:
+        await message.answer("متن خالی است. دوباره بفرست:")
+        return
+
+    total = await link_repo.count_links()
+    await state.update_data(broadcast_text=text)
+    await state.set_state(AdminStates.broadcast_confirm)
+    await message.answer(f"📣 این پیام برای {total} دانشجو ارسال شود؟\n\n{text}", reply_markup=broadcast_confirm_kb())
+
+
+# Not tied to the state, so a button left over from an earlier prompt still gets an answer.
+@router.callback_query(AdminBroadcastCb.filter(), IsOwner())
+async def on_broadcast_confirm(call: CallbackQuery, callback_data: AdminBroadcastCb, state: FSMContext, outbox: Outbox) -> None:
+    text = (await state.get_data()).get("broadcast_text")
+    if await state.get_state() != AdminStates.broadcast_confirm.state or not text:
+        await call.answer("این درخواست منقضی شده است.")
+        await call.message.edit_reply_markup(reply_markup=None)
+        return
+
+    await state.clear()
+    if callback_data.action != "send":
+        await call.message.edit_text("پیام همگانی لغو شد.")
+        await call.answer()
+        return
+
+    broadcast_id, total = await start_broadcast(outbox, text, requested_by=call.from_user.id)
+    await call.message.edit_text(f"📣 Broadcast #{broadcast_id} queued for {total} students.")
+    await call.answer()
 
 
 @router.message(AdminStates.browsing_students, IsOwner())
 async def on_students_list_message(message: Message, state: FSMContext, student_repo: StudentRepo) -> None:
     text = (message.text or "").strip()
-    data = await state.get_data()
-    packed = data.get("students") or []
-    page = int(data.get("page") or 0)
 
     if text == "Next":
-        page += 1
-        await state.update_data(page=page)
-        await message.answer("Students List:", reply_markup=students_page_kb(packed, page=page))
+        data = await state.get_data()
+        await _show_students_page(message, state, student_repo, cursor=data.get("page_last"), direction="next")
         return
     if text == "Prev":
-        page = max(0, page - 1)
-        await state.update_data(page=page)
-        await message.answer("Students List:", reply_markup=students_page_kb(packed, page=page))
+        data = await state.get_data()
+        await _show_students_page(message, state, student_repo, cursor=data.get("page_first"), direction="prev")
         return
     if text == "Back":
         await state.clear()
@@ -63,12 +216,12 @@ async def on_students_list_message(message: Message, state: FSMContext, student_
 
     sid = text.split("-", 1)[0].strip() if "-" in text else None
     if not sid:
-        await message.answer("Unknown Command.", reply_markup=students_page_kb(packed, page=page))
+        await message.answer("Unknown Command.")
         return
 
     student = await student_repo.get_student(sid)
     if not student:
-        await message.answer("Student Not Found.", reply_markup=students_page_kb(packed, page=page))
+        await message.answer("Student Not Found.")
         return
 
     await state.update_data(selected_student_id=sid)
@@ -79,7 +232,7 @@ async def on_students_list_message(message: Message, state: FSMContext, student_
 
 
 @router.callback_query(AdminStudentCb.filter(), IsOwner())
-async def on_student_action(call: CallbackQuery, callback_data: AdminStudentCb, state: FSMContext, student_repo: StudentRepo, link_repo: LinkRepo) -> None:
+async def on_student_action(call: CallbackQuery, callback_data: AdminStudentCb, state: FSMContext, student_repo: StudentRepo, link_repo: LinkRepo, grade_repo: GradeRepo) -> None:
     sid = callback_data.student_id
     action = callback_data.action
 
@@ -102,19 +255,13 @@ async def on_student_action(call: CallbackQuery, callback_data: AdminStudentCb,
         return
 
     if action == "grades":
-        courses = list_courses()
-        if not courses:
+        grades = await grade_repo.get_student_grades(sid)
+        if not grades and not await grade_repo.list_courses():
             await call.message.answer("هیچ فایل نمره‌ای موجود نیست.")
             await call.answer()
             return
 
-        lines = []
-        for c in courses:
-            g = get_grade(c, sid)
-            if g is not None:
-                lines.append(f"{c}: {g}")
-
-        await call.message.answer("Grades:\n" + ("\n".join(lines) if lines else "No Grade Found"))
+        await call.message.answer("Grades:\n" + (format_all_grades(grades) if grades else "No Grade Found"))
         await call.answer()
         return
 
@@ -5,3 +5,5 @@ class AdminStates(StatesGroup):
     browsing_students = State()
     editing_name_first = State()
     editing_name_last = State()
+    broadcast_text = State()
+    broadcast_confirm = State()
@@ -7,11 +7,19 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app.core.callbacks import GradeCb
 from app.core.guards import IsRegistered
-from app.db.repo import LinkRepo
-from app.utils.csv_loader import list_courses, get_grade
+from app.core.config import settings
+from app.core.identity import Identity
+from app.core.throttling import ThrottlingMiddleware
+from app.db.repo import GradeRepo
+from app.features.grades.texts import format_columns, format_all_grades
+from app.services.grade_stats import course_stats, parse_score
 
 router = Router(name="grades")
 
+_throttle = ThrottlingMiddleware("grades", *settings.THROTTLE_LIMITS["grades"], max_users=settings.THROTTLE_MAX_USERS)
+router.message.middleware(_throttle)
+router.callback_query.middleware(_throttle)
+
 
 def courses_kb(courses: list[str]):
     kb = InlineKeyboardBuilder()
@@ -22,8 +30,8 @@ def courses_kb(courses: list[str]):
 
 
 @router.message(Command("grades"), IsRegistered())
-async def cmd_grades(message: Message) -> None:
-    courses = list_courses()
+async def cmd_grades(message: Message, grade_repo: GradeRepo) -> None:
+    courses = await grade_repo.list_courses()
     if not courses:
         await message.answer("فعلاً هیچ فایل نمره‌ای موجود نیست.")
         return
@@ -31,13 +39,28 @@ async def cmd_grades(message: Message) -> None:
 
 
 @router.callback_query(GradeCb.filter(), IsRegistered())
-async def on_course(call: CallbackQuery, callback_data: GradeCb, link_repo: LinkRepo) -> None:
-    link = await link_repo.get_link_by_telegram(call.from_user.id)
-    grade = get_grade(callback_data.course, link.student_id)
+async def on_course(call: CallbackQuery, callback_data: GradeCb, identity: Identity, grade_repo: GradeRepo) -> None:
+    columns = await grade_repo.get_grades(callback_data.course, identity.student_id)
 
-    if grade is None:
+    if not columns:
         await call.message.answer(f"برای درس {callback_data.course} نمره‌ای برای شما پیدا نشد.")
     else:
-        await call.message.answer(f"نمرهٔ شما در {callback_data.course}: {grade}")
+        ranks = {}
+        stats = await course_stats(grade_repo, callback_data.course)
+        if stats is not None:
+            for name, value in columns:
+                col, score = stats.column(name), parse_score(value)
+                if col is not None and score is not None:
+                    ranks[name] = (col.rank(score), col.count)
+        await call.message.answer(f"نمرات شما در {callback_data.course}:\n{format_columns(columns, ranks)}")
 
     await call.answer()
+
+
+@router.message(Command("mygrades"), IsRegistered())
+async def cmd_my_grades(message: Message, identity: Identity, grade_repo: GradeRepo) -> None:
+    grades = await grade_repo.get_student_grades(identity.student_id)
+    if not grades:
+        await message.answer("هنوز نمره‌ای برای شما ثبت نشده است.")
+        return
+    await message.answer("نمرات شما:\n\n" + format_all_grades(grades))
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from app.services.grade_stats import CourseStats
+
+
+def format_columns(columns: list[tuple[str, str]], ranks: dict[str, tuple[int, int]] | None = None) -> str:
+    lines = []
+    for name, value in columns:
+        if ranks and name in ranks:
+            rank, count = ranks[name]
+            lines.append(f"{name}: {value} (رتبه {rank} از {count})")
+        else:
+            lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+def format_all_grades(grades: dict[str, list[tuple[str, str]]]) -> str:
+    return "\n\n".join(f"📘 {course}\n{format_columns(columns)}" for course, columns in grades.items())
+
+
+def _num(x: float) -> str:
+    return f"{x:.2f}".rstrip("0").rstrip(".")
+
+
+def format_course_stats(stats: CourseStats) -> str:
+    blocks = [f"📊 {stats.course}"]
+    for col in stats.columns:
+        lines = [
+            f"▫️ {col.name}",
+            f"n={col.count}  mean={_num(col.mean)}  median={_num(col.median)}",
+            f"min={_num(col.values[0])}  max={_num(col.values[-1])}  pass(≥{_num(col.pass_mark)})={col.pass_rate:.0%}",
+        ]
+        top = max(n for _, _, n in col.histogram()) or 1
+        for lo, hi, n in col.histogram():
+            lines.append(f"{_num(lo)}–{_num(hi)}: {'█' * round(8 * n / top)} {n}")
+        blocks.append("\n".join(lines))
+    if len(blocks) == 1:
+        blocks.append("No numeric grades.")
+    return "\n\n".join(blocks)
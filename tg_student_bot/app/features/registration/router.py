@@ -6,13 +6,22 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
 from app.core.callbacks import RegCb
+from app.core.config import settings
+from app.core.identity import Identity
+from app.core.throttling import ThrottlingMiddleware
 from app.features.registration.states import RegistrationStates
 from app.features.registration.keyboards import confirm_kb
-from app.db.repo import StudentRepo, LinkRepo, AttemptRepo
-from app.utils.csv_loader import iter_registry_rows
+from app.db.repo import LinkRepo, AttemptRepo, RegistrationRepo
+from app.db.registry_snapshot import registry_snapshot
+from app.db.registry_sync import sync_registry
+from app.utils.persian import normalize_student_id
 
 router = Router(name="registration")
 
+_throttle = ThrottlingMiddleware("registration", *settings.THROTTLE_LIMITS["registration"], max_users=settings.THROTTLE_MAX_USERS)
+router.message.middleware(_throttle)
+router.callback_query.middleware(_throttle)
+
 WELCOME = (
     "سلام 👋\n"
     "برای استفاده از ربات، ابتدا باید ثبت‌نام کنید.\n"
@@ -22,22 +31,12 @@ WELCOME = (
 LOCKED = "اکانت شما به دلیل ۳ تلاش ناموفق قفل شده است. با پشتیبانی تماس بگیرید."
 
 
-async def ensure_registry_loaded(student_repo: StudentRepo) -> None:
-    for row in iter_registry_rows():
-        sid = row.get("student_id", "").strip()
-        fn = row.get("first_name", "").strip()
-        ln = row.get("last_name", "").strip()
-        if sid and fn and ln:
-            await student_repo.upsert_student(sid, fn, ln)
-
-
 @router.message(Command("start"))
-async def start(message: Message, state: FSMContext, student_repo: StudentRepo, link_repo: LinkRepo, attempt_repo: AttemptRepo) -> None:
-    await ensure_registry_loaded(student_repo)
+async def start(message: Message, state: FSMContext, identity: Identity, attempt_repo: AttemptRepo) -> None:
+    await sync_registry()
 
     user_id = message.from_user.id
-    link = await link_repo.get_link_by_telegram(user_id)
-    if link:
+    if identity.registered:
         await message.answer("شما قبلاً ثبت‌نام کرده‌اید.\nبرای دیدن نمرات دستور /grades را بزنید.")
         return
 
@@ -51,41 +50,37 @@ async def start(message: Message, state: FSMContext, student_repo: StudentRepo,
     await message.answer(f"{WELCOME}\n\nتلاش باقی‌مانده: {remaining}")
 
 
-@router.message(RegistrationStates.waiting_student_id)
-async def on_student_id(message: Message, state: FSMContext, student_repo: StudentRepo, link_repo: LinkRepo, attempt_repo: AttemptRepo) -> None:
-    user_id = message.from_user.id
-    attempt = await attempt_repo.get_or_create(user_id)
-    if attempt.locked:
+async def _reject(message: Message, registration_repo: RegistrationRepo, reason: str, reason_locked: str) -> None:
+    attempt = await registration_repo.record_failure(message.from_user.id)
+    if attempt is None:
         await message.answer(LOCKED)
-        return
+    elif attempt.locked:
+        await message.answer(reason_locked)
+    else:
+        await message.answer(f"{reason}\nتلاش باقی‌مانده: {3 - attempt.failures}")
+
+
+@router.message(RegistrationStates.waiting_student_id)
+async def on_student_id(message: Message, state: FSMContext, registration_repo: RegistrationRepo) -> None:
+    sid = normalize_student_id(message.text or "")
 
-    sid = (message.text or "").strip()
+    # Malformed and unknown ids are turned away from memory; only the failure is written.
+    if not (sid.isascii() and sid.isdigit()) or len(sid) < 5:
+        await _reject(message, registration_repo, "شمارهٔ دانشجویی نامعتبر است.", "شمارهٔ دانشجویی نامعتبر بود و اکانت شما قفل شد.")
+        return
 
-    # Basic validation
-    if not sid.isdigit() or len(sid) < 5:
-        attempt = await attempt_repo.increment_failure(user_id)
-        if attempt.locked:
-            await message.answer("شمارهٔ دانشجویی نامعتبر بود و اکانت شما قفل شد.")
-        else:
-            await message.answer(f"شمارهٔ دانشجویی نامعتبر است.\nتلاش باقی‌مانده: {3 - attempt.failures}")
+    student = registry_snapshot.get(sid)
+    if student is None:
+        await _reject(message, registration_repo, "این شمارهٔ دانشجویی در لیست نیست.", "این شمارهٔ دانشجویی در لیست نیست و اکانت شما قفل شد.")
         return
 
-    student = await student_repo.get_student(sid)
-    if not student:
-        attempt = await attempt_repo.increment_failure(user_id)
-        if attempt.locked:
-            await message.answer("این شمارهٔ دانشجویی در لیست نیست و اکانت شما قفل شد.")
-        else:
-            await message.answer(f"این شمارهٔ دانشجویی در لیست نیست.\nتلاش باقی‌مانده: {3 - attempt.failures}")
+    check = await registration_repo.check(message.from_user.id, sid)
+    if check.locked:
+        await message.answer(LOCKED)
         return
 
-    existing = await link_repo.get_link_by_student(sid)
-    if existing:
-        attempt = await attempt_repo.increment_failure(user_id)
-        if attempt.locked:
-            await message.answer("این شمارهٔ دانشجویی قبلاً ثبت شده است و اکانت شما قفل شد.")
-        else:
-            await message.answer(f"این شمارهٔ دانشجویی قبلاً ثبت شده است.\nتلاش باقی‌مانده: {3 - attempt.failures}")
+    if check.linked:
+        await _reject(message, registration_repo, "این شمارهٔ دانشجویی قبلاً ثبت شده است.", "این شمارهٔ دانشجویی قبلاً ثبت شده است و اکانت شما قفل شد.")
         return
 
     await state.update_data(student_id=sid)
@@ -93,7 +88,7 @@ async def on_student_id(message: Message, state: FSMContext, student_repo: Stude
 
     await message.answer(
         "اطلاعات شما پیدا شد:\n"
-        f"شمارهٔ دانشجویی: {student.student_id}\n"
+        f"شمارهٔ دانشجویی: {sid}\n"
         f"نام: {student.first_name}\n"
         f"نام خانوادگی: {student.last_name}\n\n"
         "آیا تأیید می‌کنید؟",
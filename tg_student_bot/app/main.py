@@ -1,48 +1,168 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import logging
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from app.core.config import settings
+from app.core.executor import ChatExecutor, ChatOrderMiddleware
 from app.core.logging import setup_logging
+from app.core.identity import IdentityMiddleware
+from app.core.metrics import HandlerMetricsMiddleware, UpdateMetricsMiddleware, metrics, start_metrics_server
+from app.core.throttling import ThrottlingMiddleware
+from app.core.webhook import run_webhook
 
-from app.db.session import engine, SessionLocal
-from app.db.base import Base
-from app.db.repo import StudentRepo, LinkRepo, AttemptRepo
+from app.db.session import current_session, engine, LazySession, session_stats
+from app.db.migrations import migrate
+from app.db.repo import StudentRepo, LinkRepo, AttemptRepo, GradeRepo, RegistrationRepo
+from app.db.registry_snapshot import load_registry_snapshot
+from app.db.registry_sync import sync_registry
+from app.db.student_index import load_student_index
+from app.db.grade_ingest import sync_grades
+from app.db.fsm_storage import SQLStorage
 
 from app.features.registration.router import router as registration_router
 from app.features.grades.router import router as grades_router
 from app.features.admin.router import router as admin_router
+from app.services.grade_watcher import watch_grades
+from app.services.outbox import Outbox
+from app.services.broadcast import resume_broadcasts
+
+log = logging.getLogger(__name__)
 
 
 async def _init_db() -> None:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    version = await migrate(engine)
+    log.info("Database schema at version %d", version)
 
 
-async def _run() -> None:
-    setup_logging()
-    await _init_db()
+def build_bot() -> Bot:
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.BOT_TOKEN, session=session)
+
 
-    bot = Bot(token=settings.BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+def build_storage() -> BaseStorage:
+    if settings.FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLStorage(engine, ttl=settings.FSM_STATE_TTL, cache_size=settings.FSM_CACHE_SIZE)
+
+
+def build_dispatcher(storage: BaseStorage | None = None, executor: ChatExecutor | None = None) -> Dispatcher:
+    storage = storage or build_storage()
+    dp = Dispatcher(storage=storage)
 
     async def _inject(handler, event, data):
-        async with SessionLocal() as session:
-            data["student_repo"] = StudentRepo(session)
-            data["link_repo"] = LinkRepo(session)
-            data["attempt_repo"] = AttemptRepo(session)
-            data["owner_student_id"] = settings.OWNER_STUDENT_ID
-            return await handler(event, data)
+        session = LazySession()
+        token = current_session.set(session)
+        data["student_repo"] = StudentRepo(session)
+        data["link_repo"] = LinkRepo(session)
+        data["attempt_repo"] = AttemptRepo(session)
+        data["grade_repo"] = GradeRepo(session)
+        data["registration_repo"] = RegistrationRepo(session)
+        data["owner_student_id"] = settings.OWNER_STUDENT_ID
+        try:
+            async with storage.batch() if isinstance(storage, SQLStorage) else contextlib.nullcontext():
+                return await handler(event, data)
+        finally:
+            current_session.reset(token)
+            await session.close()
+            session_stats.updates += 1
+            if session.opened:
+                session_stats.opened += 1
+            log.debug("update %s: db session %s", event.update_id, "opened" if session.opened else "not used")
 
+    if executor is not None:
+        dp.update.outer_middleware(ChatOrderMiddleware(executor))
+        metrics.gauges["updates_queued"] = executor.pending
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(
+        ThrottlingMiddleware("update", settings.THROTTLE_RATE, settings.THROTTLE_BURST, max_users=settings.THROTTLE_MAX_USERS)
+    )
     dp.update.outer_middleware(_inject)
+    dp.update.outer_middleware(IdentityMiddleware())
 
     dp.include_router(registration_router)
     dp.include_router(grades_router)
     dp.include_router(admin_router)
 
-    await dp.start_polling(bot)
+    # Registered after each router's throttle so dropped updates aren't timed as handler calls.
+    handler_metrics = HandlerMetricsMiddleware()
+    for router in (registration_router, grades_router, admin_router):
+        router.message.middleware(handler_metrics)
+        router.callback_query.middleware(handler_metrics)
+        router.inline_query.middleware(handler_metrics)
+    return dp
+
+
+async def prepare() -> None:
+    """One-off startup work: schema, registry and grade import, FSM cleanup."""
+    await _init_db()
+    await sync_registry(force=True)
+    await sync_grades(force=True)
+    storage = build_storage()
+    if isinstance(storage, SQLStorage):
+        await storage.purge_expired()
+
+
+async def start_services(bot: Bot, dp: Dispatcher, outbox_rate: float, leader: bool = True) -> list[asyncio.Task[None]]:
+    """Outbox, metrics and (on the leader only) the grade watcher and broadcast resumption."""
+    outbox = Outbox(bot, rate=outbox_rate, chat_rate=settings.OUTBOX_CHAT_RATE, max_inflight=settings.OUTBOX_MAX_INFLIGHT)
+    dp["outbox"] = outbox
+    metrics.gauges.update({
+        "db_sessions_opened": lambda: session_stats.opened,
+        "outbox_pending": outbox.pending,
+        "outbox_sent": lambda: outbox.sent,
+        "outbox_failed": lambda: outbox.failed,
+        "outbox_retried": lambda: outbox.retried,
+    })
+    log.info("Search index: %d students", await load_student_index())
+    log.info("Registry snapshot: %d students", await load_registry_snapshot())
+
+    background = [asyncio.create_task(outbox.run())]
+    if leader:
+        background.append(
+            asyncio.create_task(watch_grades(outbox, settings.GRADES_POLL_INTERVAL, notify=settings.GRADE_NOTIFICATIONS))
+        )
+        await resume_broadcasts(outbox)
+    return background
+
+
+async def _run() -> None:
+    setup_logging()
+    await prepare()
+    if settings.WORKERS > 1:
+        from app.workers import run_master
+
+        await run_master(settings.WORKERS)
+        return
+
+    polling = settings.RUN_MODE != "webhook"
+    executor = ChatExecutor(settings.POLL_CONCURRENCY, settings.CHAT_BACKLOG) if polling else None
+    bot = build_bot()
+    dp = build_dispatcher(executor=executor)
+    background = await start_services(bot, dp, settings.OUTBOX_RATE)
+    metrics_runner = await start_metrics_server(settings.WEBAPP_HOST, settings.METRICS_PORT) if settings.METRICS_PORT else None
+    try:
+        if executor is None:
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook()
+            # The executor does the concurrency; the polling loop only hands updates over.
+            await dp.start_polling(bot, handle_as_tasks=False, close_bot_session=False)
+            await executor.drain(settings.WEBHOOK_DRAIN_TIMEOUT)
+            await bot.session.close()
+    finally:
+        for task in background:
+            task.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 def main() -> None:
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+
+from sqlalchemy import func, literal, select, update
+
+from app.db.models import Broadcast, BroadcastRecipient, UserLink
+from app.db.session import SessionLocal
+from app.services.outbox import Lane, Outbox
+
+log = logging.getLogger(__name__)
+
+PENDING, SENT, FAILED = 0, 1, 2
+FLUSH_INTERVAL = 1.0
+
+_running: dict[int, asyncio.Task[None]] = {}
+
+
+async def start_broadcast(outbox: Outbox, text: str, requested_by: int) -> tuple[int, int]:
+    """Persist a broadcast to every linked user and start delivering it; returns (id, recipients)."""
+    async with SessionLocal() as session:
+        async with session.begin():
+            b = Broadcast(text=text, requested_by=requested_by, status="running")
+            session.add(b)
+            await session.flush()
+            await session.execute(
+                BroadcastRecipient.__table__.insert().from_select(
+                    ["broadcast_id", "telegram_id", "status"],
+                    select(literal(b.id), UserLink.telegram_id, literal(PENDING)),
+                )
+            )
+            b.total = await session.scalar(
+                select(func.count()).select_from(BroadcastRecipient).where(BroadcastRecipient.broadcast_id == b.id)
+            )
+            broadcast_id, total = b.id, b.total
+    _spawn(outbox, broadcast_id)
+    return broadcast_id, total
+
+
+async def resume_broadcasts(outbox: Outbox) -> None:
+    async with SessionLocal() as session:
+        ids = (await session.execute(select(Broadcast.id).where(Broadcast.status == "running"))).scalars().all()
+    for broadcast_id in ids:
+        log.info("Resuming broadcast #%d", broadcast_id)
+        _spawn(outbox, broadcast_id)
+
+
+def _spawn(outbox: Outbox, broadcast_id: int) -> None:
+    if broadcast_id in _running:
+        return
+    # Not the admin update's context, or its queries would be billed to that update.
+    task = asyncio.create_task(_deliver(outbox, broadcast_id), context=contextvars.Context())
+    _running[broadcast_id] = task
+    task.add_done_callback(lambda _: _running.pop(broadcast_id, None))
+
+
+async def _flush(broadcast_id: int, results: list[tuple[int, bool]]) -> None:
+    sent = [chat_id for chat_id, ok in results if ok]
+    failed = [chat_id for chat_id, ok in results if not ok]
+    async with SessionLocal() as session:
+        async with session.begin():
+            for status, ids in ((SENT, sent), (FAILED, failed)):
+                if ids:
+                    await session.execute(
+                        update(BroadcastRecipient)
+                        .where(BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.telegram_id.in_(ids))
+                        .values(status=status)
+                    )
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(sent=Broadcast.sent + len(sent), failed=Broadcast.failed + len(failed))
+            )
+
+
+async def _deliver(outbox: Outbox, broadcast_id: int) -> None:
+    async with SessionLocal() as session:
+        b = await session.get(Broadcast, broadcast_id)
+        pending = (await session.execute(
+            select(BroadcastRecipient.telegram_id).where(
+                BroadcastRecipient.broadcast_id == broadcast_id, BroadcastRecipient.status == PENDING
+            )
+        )).scalars().all()
+
+    results: list[tuple[int, bool]] = []
+    remaining = len(pending)
+    done = asyncio.Event()
+
+    def on_done(chat_id: int, ok: bool) -> None:
+        nonlocal remaining
+        results.append((chat_id, ok))
+        remaining -= 1
+        if remaining == 0:
+            done.set()
+
+    if not pending:
+        done.set()
+    for telegram_id in pending:
+        outbox.submit(telegram_id, b.text, Lane.BULK, on_done)
+
+    # Progress is written in batches so a restart resumes from the last flush.
+    while True:
+        try:
+            await asyncio.wait_for(done.wait(), FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        batch, results[:] = results[:], []
+        if batch:
+            await _flush(broadcast_id, batch)
+        if done.is_set():
+            break
+
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(status="done"))
+        b = await session.get(Broadcast, broadcast_id, populate_existing=True)
+    log.info("Broadcast #%d done: %d sent, %d failed", broadcast_id, b.sent, b.failed)
+    outbox.submit(b.requested_by, f"📣 Broadcast #{broadcast_id} finished: {b.sent} sent, {b.failed} failed.", Lane.INTERACTIVE)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.types import Document
+from sqlalchemy import select
+
+from app.core.callbacks import AdminStatsCb, GradeCb
+from app.core.config import settings
+from app.db.grade_ingest import ingest_lock, sync_grades
+from app.db.models import GradeRow, StudentRegistry
+from app.db.registry_snapshot import StudentName, registry_snapshot
+from app.db.registry_sync import sync_registry
+from app.db.session import SessionLocal
+from app.services.grade_watcher import notify_students
+from app.services.outbox import Outbox
+from app.utils.csv_loader import GRADES_DIR, REGISTRY_PATH, run_io
+from app.utils.persian import normalize_student_id
+
+log = logging.getLogger(__name__)
+
+MAX_UPLOAD = 20 * 1024 * 1024  # largest file the Bot API lets a bot download
+REGISTRY_COLUMNS = ("student_id", "first_name", "last_name")
+MAX_SAMPLES = 5
+
+
+class UploadError(Exception):
+    """The file as a whole can't be imported; nothing on disk was changed."""
+
+
+@dataclass
+class ImportReport:
+    target: str
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+    removed: int = 0
+    samples: list[str] = field(default_factory=list)  # first few rejection reasons
+    seconds: float = 0.0
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(f"line {line}: {reason}")
+
+
+def _student_id(raw: str) -> str | None:
+    sid = normalize_student_id(raw)
+    return sid if sid.isascii() and sid.isdigit() and len(sid) >= 5 else None
+
+
+def _open_rows(src: Path):
+    f = src.open("r", encoding="utf-8-sig", newline="")
+    return f, csv.reader(f)
+
+
+def _header(reader, required: tuple[str, ...]) -> list[str]:
+    header = [h.strip() for h in next(reader, [])]
+    missing = [c for c in required if c not in header]
+    if missing:
+        raise UploadError(f"Missing column(s): {', '.join(missing)}")
+    if any(not h for h in header) or len(set(header)) != len(header):
+        raise UploadError("Column names must be non-empty and unique")
+    return header
+
+
+def _copy_registry(src: Path, dst: Path, known: Callable[[str], StudentName | None], report: ImportReport) -> set[str]:
+    """Validate ``src`` row by row, write the accepted rows to ``dst`` and return their ids."""
+    f, reader = _open_rows(src)
+    with f, dst.open("w", encoding="utf-8", newline="") as out:
+        header = _header(reader, REGISTRY_COLUMNS)
+        pos = [header.index(c) for c in REGISTRY_COLUMNS]
+        writer = csv.writer(out)
+        writer.writerow(REGISTRY_COLUMNS)
+        seen: set[str] = set()
+        for rec in reader:
+            if not any(cell.strip() for cell in rec):
+                continue
+            sid, first_name, last_name = ((rec[i] if i < len(rec) else "").strip() for i in pos)
+            line = reader.line_num
+            if len(rec) > len(header):
+                report.reject(line, "more cells than columns")
+            elif (sid := _student_id(sid)) is None:
+                report.reject(line, "student_id must be at least 5 digits")
+            elif not first_name or not last_name:
+                report.reject(line, "first_name and last_name are required")
+            elif sid in seen:
+                report.reject(line, f"duplicate student_id {sid}")
+            else:
+                seen.add(sid)
+                writer.writerow((sid, first_name, last_name))
+                old = known(sid)
+                if old is None:
+                    report.inserted += 1
+                elif (old.first_name, old.last_name) != (first_name, last_name):
+                    report.updated += 1
+                else:
+                    report.unchanged += 1
+    return seen
+
+
+def _copy_grades(src: Path, dst: Path, report: ImportReport) -> set[str]:
+    """Validate ``src`` row by row, write the accepted rows to ``dst`` and return their ids."""
+    f, reader = _open_rows(src)
+    with f, dst.open("w", encoding="utf-8", newline="") as out:
+        header = _header(reader, ("student_id",))
+        sid_pos = header.index("student_id")
+        writer = csv.writer(out)
+        writer.writerow(header)
+        seen: set[str] = set()
+        for rec in reader:
+            if not any(cell.strip() for cell in rec):
+                continue
+            line = reader.line_num
+            cells = [(rec[i] if i < len(rec) else "").strip() for i in range(len(header))]
+            if len(rec) > len(header):
+                report.reject(line, "more cells than columns")
+            elif (sid := _student_id(cells[sid_pos])) is None:
+                report.reject(line, "student_id must be at least 5 digits")
+            elif sid in seen:
+                report.reject(line, f"duplicate student_id {sid}")
+            else:
+                seen.add(sid)
+                cells[sid_pos] = sid
+                writer.writerow(cells)
+    return seen
+
+
+def _target(file_name: str) -> tuple[Path, str | None]:
+    """Destination for an uploaded file name, and the course it holds (None for the registry)."""
+    name = Path(file_name).name
+    if not name.lower().endswith(".csv") or name.startswith("."):
+        raise UploadError("Send a .csv file: students.csv for the registry, <course>.csv for grades")
+    if name.lower() == REGISTRY_PATH.name:
+        return REGISTRY_PATH, None
+    course = name[:-4]
+    # The course name travels in the /grades and Course Stats button payloads.
+    try:
+        for cb in (GradeCb(course=course), AdminStatsCb(course=course)):
+            cb.pack()
+    except ValueError:
+        raise UploadError(
+            "The course name (file name) must not contain ':' and must fit in a button's 64-byte callback data"
+        ) from None
+    return GRADES_DIR / f"{course}.csv", course
+
+
+async def _stored_students(course: str | None) -> set[str]:
+    """Student ids currently in the registry (``course`` None) or in one course."""
+    if course is None:
+        q = select(StudentRegistry.student_id)
+    else:
+        q = select(GradeRow.student_id).where(GradeRow.course == course)
+    async with SessionLocal() as session:
+        return set((await session.execute(q)).scalars().all())
+
+
+def _validate(src: Path, dst: Path, course: str | None, report: ImportReport) -> set[str]:
+    try:
+        if course is None:
+            return _copy_registry(src, dst, registry_snapshot.get, report)
+        return _copy_grades(src, dst, report)
+    except UnicodeDecodeError:
+        raise UploadError("The file is not UTF-8 text") from None
+    except csv.Error as e:
+        raise UploadError(f"Not a valid CSV file: {e}") from None
+
+
+async def import_document(bot: Bot, document: Document, outbox: Outbox) -> ImportReport:
+    """Replace the registry or one course file with an uploaded CSV and sync it into the DB.
+
+    The upload is streamed to a temp file, then validated row by row into a second temp
+    file next to the target, which replaces it atomically. Rejected rows are left out and
+    counted; a bad header or encoding rejects the whole file. Students left out of a
+    registry upload are removed (and unlinked).
+    """
+    started = time.monotonic()
+    target, course = _target(document.file_name or "")
+    if document.file_size and document.file_size > MAX_UPLOAD:
+        raise UploadError(f"File is larger than {MAX_UPLOAD // (1024 * 1024)} MB")
+
+    report = ImportReport(str(target))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Not *.csv, or the grade watcher would pick them up as courses.
+    fd, raw_name = tempfile.mkstemp(dir=target.parent, prefix=".upload-", suffix=".part")
+    os.close(fd)
+    fd, clean_name = tempfile.mkstemp(dir=target.parent, prefix=".import-", suffix=".part")
+    os.close(fd)
+    raw, clean = Path(raw_name), Path(clean_name)
+    changed: set[str] = set()
+    try:
+        await bot.download(document, destination=raw)
+        accepted = await run_io(_validate, raw, clean, course, report)
+        if not accepted:
+            raise UploadError("No valid rows; nothing was changed")
+
+        # Held until synced, so the watcher can't ingest the new file before the diff.
+        async with ingest_lock:
+            old_ids = await _stored_students(course)
+            await run_io(os.replace, clean, target)
+            removed = old_ids - accepted
+            if course is None:
+                await sync_registry(force=True, remove=removed)
+            else:
+                changed = (await sync_grades(force=True)).get(course, set())
+    finally:
+        raw.unlink(missing_ok=True)
+        clean.unlink(missing_ok=True)
+
+    report.removed = len(removed)
+    if course is not None:
+        report.inserted = len(accepted - old_ids)
+        report.updated = len(changed & old_ids)
+        report.unchanged = len(accepted) - report.inserted - report.updated
+        if settings.GRADE_NOTIFICATIONS and changed:
+            await notify_students(outbox, course, changed)
+
+    report.seconds = time.monotonic() - started
+    log.info("Imported %s: %s", target, report)
+    return report
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.config import settings
+from app.db.repo import GradeRepo
+from app.utils.persian import normalize_search
+
+HIST_BINS = 5
+
+# A full mark declared at the end of a column header: "final (100)", "midterm/20",
+# "عملی (از پنج نمره)".
+_DECLARED_MAX = re.compile(r"(?:\((?:\s*از)?\s*([^()]+?)\s*(?:نمره)?\s*\)|/\s*(\d+(?:\.\d+)?))\s*$")
+_NUMBER_WORDS = {
+    "یک": 1, "دو": 2, "سه": 3, "چهار": 4, "پنج": 5, "شش": 6, "هفت": 7, "هشت": 8, "نه": 9, "ده": 10,
+    "یازده": 11, "دوازده": 12, "سیزده": 13, "چهارده": 14, "پانزده": 15, "پونزده": 15, "شانزده": 16,
+    "هفده": 17, "هجده": 18, "هیجده": 18, "نوزده": 19, "بیست": 20, "سی": 30, "چهل": 40, "پنجاه": 50, "صد": 100,
+}
+
+
+def _number(text: str) -> float | None:
+    """``12``, ``۱۲`` or ``دوازده``; compound words like ``بیست و پنج`` are summed."""
+    score = parse_score(text)
+    if score is not None:
+        return score
+    parts = [_NUMBER_WORDS.get(w) for w in text.split(" و ")]
+    return float(sum(parts)) if parts and None not in parts else None
+
+
+def full_mark(column: str) -> float:
+    """The column's declared maximum, else ``GRADE_SCALE``."""
+    m = _DECLARED_MAX.search(normalize_search(column))
+    mark = _number(m.group(1) or m.group(2)) if m else None
+    return mark if mark else settings.GRADE_SCALE
+
+
+@dataclass
+class ColumnStats:
+    name: str
+    values: np.ndarray  # float64, sorted ascending
+    pass_mark: float
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    @property
+    def mean(self) -> float:
+        return float(self.values.mean())
+
+    @property
+    def median(self) -> float:
+        return float(np.median(self.values))
+
+    @property
+    def pass_rate(self) -> float:
+        """Share of students at or above ``pass_mark``."""
+        return float((self.values >= self.pass_mark).mean())
+
+    def histogram(self, bins: int = HIST_BINS) -> list[tuple[float, float, int]]:
+        lo, hi = float(self.values[0]), float(self.values[-1])
+        if lo == hi:
+            return [(lo, hi, len(self.values))]
+        counts, edges = np.histogram(self.values, bins=bins, range=(lo, hi))  # the top edge is inclusive
+        return [(float(edges[i]), float(edges[i + 1]), int(counts[i])) for i in range(bins)]
+
+    def rank(self, value: float) -> int:
+        """1 for the top score; ties share a rank."""
+        return len(self.values) - int(np.searchsorted(self.values, value, side="right")) + 1
+
+
+@dataclass
+class CourseStats:
+    course: str
+    file_hash: str
+    columns: list[ColumnStats]
+
+    def column(self, name: str) -> ColumnStats | None:
+        return next((c for c in self.columns if c.name == name), None)
+
+
+# course -> stats for the grade file it was computed from; a new file hash invalidates it.
+_cache: dict[str, CourseStats] = {}
+
+
+def invalidate(courses: list[str]) -> None:
+    for course in courses:
+        _cache.pop(course, None)
+
+
+def parse_score(value: str) -> float | None:
+    try:
+        score = float(value)
+    except ValueError:
+        return None
+    return score if math.isfinite(score) else None
+
+
+async def course_stats(grade_repo: GradeRepo, course: str) -> CourseStats | None:
+    """Per-column statistics for ``course``; one indexed lookup when cached."""
+    file_hash = await grade_repo.course_hash(course)
+    if file_hash is None:
+        _cache.pop(course, None)
+        return None
+    cached = _cache.get(course)
+    if cached is not None and cached.file_hash == file_hash:
+        return cached
+
+    columns, values = await grade_repo.course_values(course)
+    parsed = [(position, score) for position, value in values if (score := parse_score(value)) is not None]
+    positions = np.fromiter((p for p, _ in parsed), dtype=np.int64, count=len(parsed))
+    scores = np.fromiter((v for _, v in parsed), dtype=np.float64, count=len(parsed))
+    # Sorted by column, then score: each column is one contiguous, already sorted slice.
+    order = np.lexsort((scores, positions))
+    positions, scores = positions[order], scores[order]
+    bounds = np.searchsorted(positions, np.arange(len(columns) + 1))
+
+    stats = CourseStats(
+        course=course,
+        file_hash=file_hash,
+        columns=[
+            ColumnStats(name, scores[bounds[i]:bounds[i + 1]], full_mark(name) * settings.GRADE_PASS_RATIO)
+            for i, name in enumerate(columns)
+            if bounds[i] < bounds[i + 1]
+        ],
+    )
+    _cache[course] = stats
+    return stats
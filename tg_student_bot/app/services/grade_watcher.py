@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from app.db.grade_ingest import ingest_lock, sync_grades
+from app.db.repo import LinkRepo
+from app.db.session import SessionLocal
+from app.services.outbox import Lane, Outbox
+
+log = logging.getLogger(__name__)
+
+NEW_GRADES = "📢 نمرات درس {course} منتشر شد.\nبرای مشاهده: /grades"
+
+
+async def notify_students(outbox: Outbox, course: str, student_ids: set[str]) -> int:
+    async with SessionLocal() as session:
+        recipients = await LinkRepo(session).telegram_ids_for(sorted(student_ids))
+
+    text = NEW_GRADES.format(course=course)
+    for telegram_id in recipients.values():
+        outbox.submit(telegram_id, text, Lane.NOTIFY)
+    return len(recipients)
+
+
+async def watch_grades(outbox: Outbox, interval: float, notify: bool = True) -> None:
+    """Poll ``data/grades`` with stat() and re-ingest added/changed/removed course files.
+
+    Linked students whose row changed get one message per course.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with ingest_lock:
+                changes = await sync_grades()
+            for course, student_ids in changes.items():
+                if notify and student_ids:
+                    queued = await notify_students(outbox, course, student_ids)
+                    log.info("Queued %d notifications for %s (%d rows changed)", queued, course, len(student_ids))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Grade watcher iteration failed")
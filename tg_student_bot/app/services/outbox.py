@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from app.utils.token_bucket import TokenBucket
+
+log = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+class Lane(IntEnum):
+    INTERACTIVE = 0
+    NOTIFY = 1
+    BULK = 2
+
+
+@dataclass(order=True)
+class _Job:
+    lane: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    on_done: Callable[[int, bool], None] | None = field(compare=False, default=None)
+    future: asyncio.Future[bool] | None = field(compare=False, default=None)
+    attempts: int = field(compare=False, default=0)
+
+
+class Outbox:
+    """Outbound message scheduler shared by notifications and broadcasts.
+
+    Jobs are served by lane (interactive before notifications before bulk), paced by a
+    global token bucket and one bucket per chat. A 429 pauses every lane for the
+    ``retry_after`` Telegram asks for and the message is retried.
+    """
+
+    def __init__(self, bot: Bot, rate: float, chat_rate: float, max_inflight: int, max_chats: int = 10_000):
+        self.bot = bot
+        self._queue: asyncio.PriorityQueue[_Job] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._global = TokenBucket(rate, rate)
+        self._chat_rate = chat_rate
+        self._chats: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._max_chats = max_chats
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def submit(self, chat_id: int, text: str, lane: Lane = Lane.BULK, on_done: Callable[[int, bool], None] | None = None) -> None:
+        self._queue.put_nowait(_Job(lane, next(self._seq), chat_id, text, on_done))
+
+    async def send(self, chat_id: int, text: str, lane: Lane = Lane.INTERACTIVE) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Job(lane, next(self._seq), chat_id, text, future=future))
+        return await future
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, 1)
+            while len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _requeue(self, job: _Job, delay: float) -> None:
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+
+    async def run(self) -> None:
+        while True:
+            job = await self._queue.get()
+
+            now = time.monotonic()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                now = time.monotonic()
+
+            chat_wait = self._chat_bucket(job.chat_id).take(now)
+            if chat_wait:
+                # Don't hold up other chats; come back to this one when its bucket refills.
+                self._requeue(job, chat_wait)
+                continue
+
+            wait = self._global.take(now)
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._global.take(time.monotonic())
+
+            await self._inflight.acquire()
+            task = asyncio.create_task(self._deliver(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, job: _Job) -> None:
+        try:
+            job.attempts += 1
+            await self.bot.send_message(job.chat_id, job.text)
+            ok = True
+        except TelegramRetryAfter as e:
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            if job.attempts < MAX_ATTEMPTS:
+                self.retried += 1
+                self._requeue(job, e.retry_after)
+                return
+            ok = False
+        except (TelegramForbiddenError, TelegramBadRequest):
+            ok = False
+        except Exception:
+            log.exception("Failed to deliver message to %s", job.chat_id)
+            ok = False
+        finally:
+            self._inflight.release()
+
+        if ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        if job.on_done is not None:
+            job.on_done(job.chat_id, ok)
+        if job.future is not None and not job.future.done():
+            job.future.set_result(ok)
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
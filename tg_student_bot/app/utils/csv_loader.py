@@ -1,38 +1,160 @@
 from __future__ import annotations
+import asyncio
 import csv
+import hashlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Callable, Iterable, TypeVar
+
+from app.utils.persian import normalize_student_id
 
 REGISTRY_PATH = Path("data/registry/students.csv")
 GRADES_DIR = Path("data/grades")
 
+# How long a cached stat() result is trusted before the file is looked at again.
+STAT_INTERVAL = 2.0
 
-def iter_registry_rows() -> Iterable[dict[str, str]]:
-    if not REGISTRY_PATH.exists():
-        return []
-    with REGISTRY_PATH.open("r", encoding="utf-8-sig", newline="") as f:
+# All disk reads and CSV parsing run here, never on the event loop.
+IO_WORKERS = 2
+
+# Mixed into file digests: bump it when parsing changes, so files already in the DB
+# are read again.
+PARSE_VERSION = b"2"
+
+T = TypeVar("T")
+
+
+@dataclass
+class _CourseListing:
+    signature: int | None = None
+    checked_at: float = 0.0
+    courses: list[str] = field(default_factory=list)
+
+
+@dataclass
+class GradeTable:
+    digest: str
+    columns: list[str]
+    # student_id -> cell values in column order; the first row for an id wins.
+    rows: dict[str, list[str]]
+
+
+_listing = _CourseListing()
+_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="csv-io")
+_inflight: dict[tuple[Any, ...], asyncio.Future[Any]] = {}
+
+
+async def _offload(key: tuple[Any, ...], fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(*args)`` on the I/O pool; concurrent calls with the same key share one run."""
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # A cancelled waiter must not cancel the run the others are waiting on.
+    return await asyncio.shield(future)
+
+
+def _signature(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_rows(path: Path) -> Iterable[dict[str, str]]:
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            yield {k.strip(): (v or "").strip() for k, v in row.items()}
+            yield {(k or "").strip(): (v or "").strip() for k, v in row.items()}
 
 
-def list_courses() -> list[str]:
-    if not GRADES_DIR.exists():
+def _registry_rows() -> list[dict[str, str]]:
+    if not REGISTRY_PATH.exists():
         return []
-    out = [p.stem for p in GRADES_DIR.glob("*.csv")]
-    out.sort()
-    return out
+    return list(_read_rows(REGISTRY_PATH))
+
+
+def _registry_digest() -> str | None:
+    if not REGISTRY_PATH.exists():
+        return None
+    h = hashlib.sha256(PARSE_VERSION)
+    with REGISTRY_PATH.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
 
-def get_grade(course: str, student_id: str) -> str | None:
+def _list_courses(now: float) -> list[str]:
+    try:
+        sig = GRADES_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        sig = None
+    if sig != _listing.signature or _listing.checked_at == 0.0:
+        _listing.courses = sorted(p.stem for p in GRADES_DIR.glob("*.csv")) if sig is not None else []
+        _listing.signature = sig
+    _listing.checked_at = now
+    return list(_listing.courses)
+
+
+def _read_grade_table(course: str) -> GradeTable | None:
     path = GRADES_DIR / f"{course}.csv"
-    if not path.exists():
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
         return None
-    with path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sid = (row.get("student_id") or "").strip()
-            if sid == student_id:
-                g = (row.get("grade") or row.get("score") or "").strip()
-                return g or None
-    return None
+
+    reader = csv.reader(io.StringIO(raw.decode("utf-8-sig"), newline=""))
+    header = [h.strip() for h in next(reader, [])]
+    if "student_id" not in header:
+        return None
+    sid_pos = header.index("student_id")
+
+    rows: dict[str, list[str]] = {}
+    for rec in reader:
+        cells = [(rec[i] if i < len(rec) else "").strip() for i in range(len(header))]
+        sid = normalize_student_id(cells.pop(sid_pos))
+        if sid:
+            rows.setdefault(sid, cells)
+    columns = header[:sid_pos] + header[sid_pos + 1:]
+    return GradeTable(digest=hashlib.sha256(PARSE_VERSION + raw).hexdigest(), columns=columns, rows=rows)
+
+
+async def run_io(fn: Callable[..., T], *args: Any) -> T:
+    """Run other blocking file work (e.g. an import) on the same pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def read_registry_rows() -> list[dict[str, str]]:
+    return await _offload(("registry_rows",), _registry_rows)
+
+
+async def registry_signature() -> tuple[int, int] | None:
+    return await _offload(("signature", REGISTRY_PATH), _signature, REGISTRY_PATH)
+
+
+async def registry_digest() -> str | None:
+    return await _offload(("registry_digest",), _registry_digest)
+
+
+async def list_courses(force: bool = False) -> list[str]:
+    now = time.monotonic()
+    if force:
+        _listing.checked_at = 0.0
+    elif now - _listing.checked_at < STAT_INTERVAL:
+        return list(_listing.courses)
+    return await _offload(("courses",), _list_courses, now)
+
+
+async def course_signature(course: str) -> tuple[int, int] | None:
+    path = GRADES_DIR / f"{course}.csv"
+    return await _offload(("signature", path), _signature, path)
+
+
+async def read_grade_table(course: str) -> GradeTable | None:
+    """Parse a course file in one read; ``None`` if it is missing or has no student_id column."""
+    return await _offload(("grades", course), _read_grade_table, course)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+# Persian (U+06F0..) and Arabic-Indic (U+0660..) digits, plus the Arabic decimal separator.
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩٫", "01234567890123456789.")
+
+# Search folding: Arabic letter variants to their Persian forms, ZWNJ to a space,
+# tatweel and short-vowel marks dropped.
+_SEARCH = str.maketrans({
+    **{chr(c): chr(d) for c, d in _DIGITS.items()},
+    "ي": "ی", "ى": "ی", "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا",
+    "‌": " ",
+    "ـ": None,
+    **{chr(c): None for c in range(0x064B, 0x0653)},
+})
+
+
+# Invisible marks that ride along with ids copied from documents and phones.
+_ID_MARKS = dict.fromkeys(map(ord, "\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e\u2066\u2067\u2068\u2069\ufeff"))
+
+
+def normalize_digits(text: str) -> str:
+    return text.translate(_DIGITS)
+
+
+def normalize_student_id(text: str) -> str:
+    """A student id as stored: ASCII digits, no whitespace or direction marks."""
+    return "".join(text.translate(_DIGITS).translate(_ID_MARKS).split())
+
+
+def normalize_search(text: str) -> str:
+    """Fold ``text`` for matching: digits, letter variants, case and whitespace."""
+    return " ".join(text.translate(_SEARCH).lower().split())
@@ -0,0 +1,191 @@
+"""Multi-process mode (``WORKERS > 1``).
+
+One receiver process (polling or webhook) hands every raw update to one of N worker
+processes over a multiprocessing queue, picked by user id, so a user's updates are
+always handled by the same worker: its FSM cache, throttle buckets and identity
+cache stay consistent. Workers run the normal dispatcher. Changes to in-memory state
+are published on ``app.core.bus`` and relayed by the receiver to the other workers.
+Worker 0 is the leader and runs the grade watcher and broadcast resumption.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+from typing import Any, Callable
+
+from aiogram import Bot
+from aiohttp import web
+
+from app.core import bus
+from app.core.config import settings
+from app.core.executor import ChatExecutor
+from app.core.identity import identity_cache
+from app.core.logging import setup_logging
+from app.core.metrics import start_metrics_server
+from app.core.webhook import serve_webhook
+from app.db.registry_snapshot import load_registry_snapshot, registry_snapshot
+from app.db.student_index import load_student_index, student_index
+from app.main import build_bot, build_dispatcher, start_services
+from app.services import grade_stats
+
+log = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+SHUTDOWN = None
+
+
+def partition(update: dict[str, Any], workers: int) -> int:
+    """Worker index for a raw update; the same user always maps to the same worker."""
+    for key, value in update.items():
+        if key != "update_id" and isinstance(value, dict):
+            user = value.get("from") or value.get("user") or value.get("chat") or {}
+            return hash(user.get("id", 0)) % workers
+    return 0
+
+
+def _subscribe() -> None:
+    bus.subscribe(bus.IDENTITY, identity_cache.invalidate)
+    bus.subscribe(bus.IDENTITY_STUDENT, identity_cache.invalidate_student)
+    bus.subscribe(bus.STUDENT, lambda p: student_index.put(*p))
+    bus.subscribe(bus.STUDENT, lambda p: registry_snapshot.put(*p))
+    bus.subscribe(bus.REGISTRY, lambda _: load_student_index())
+    bus.subscribe(bus.REGISTRY, lambda _: load_registry_snapshot())
+    bus.subscribe(bus.GRADES, grade_stats.invalidate)
+
+
+async def _worker(index: int, workers: int, inbox: mp.Queue, events: mp.Queue) -> None:
+    setup_logging()
+    bot = build_bot()
+    executor = ChatExecutor(settings.WORKER_CONCURRENCY, settings.CHAT_BACKLOG)
+    dp = build_dispatcher(executor=executor)
+    # Each worker paces its own outbox, so together they stay under OUTBOX_RATE.
+    background = await start_services(bot, dp, settings.OUTBOX_RATE / workers, leader=index == 0)
+    metrics_runner = (
+        await start_metrics_server(settings.WEBAPP_HOST, settings.METRICS_PORT + index) if settings.METRICS_PORT else None
+    )
+    _subscribe()
+    bus.set_sink(lambda topic, payload: events.put((index, topic, payload)))
+
+    loop = asyncio.get_running_loop()
+    log.info("Worker %d started", index)
+    try:
+        running = True
+        while running:
+            batch = [await loop.run_in_executor(None, inbox.get)]
+            while True:
+                try:
+                    batch.append(inbox.get_nowait())
+                except queue.Empty:
+                    break
+            for msg in batch:
+                if msg is SHUTDOWN:
+                    running = False
+                    break
+                kind, payload = msg
+                if kind == "update":
+                    # Only queues it on the executor, so the inbox is never blocked.
+                    try:
+                        await dp.feed_raw_update(bot, payload)
+                    except Exception:
+                        log.exception("Worker %d could not queue update %s", index, payload.get("update_id"))
+                else:
+                    await bus.deliver(*payload)
+    finally:
+        bus.set_sink(None)
+        await executor.drain(settings.WEBHOOK_DRAIN_TIMEOUT)
+        for task in background:
+            task.cancel()
+        await dp["outbox"].close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        log.info("Worker %d stopped", index)
+
+
+def _worker_main(index: int, workers: int, inbox: mp.Queue, events: mp.Queue) -> None:
+    try:
+        asyncio.run(_worker(index, workers, inbox, events))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _relay(events: mp.Queue, inboxes: list[mp.Queue]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(None, events.get)
+        if item is SHUTDOWN:
+            return
+        origin, topic, payload = item
+        for i, inbox in enumerate(inboxes):
+            if i != origin:
+                inbox.put(("event", (topic, payload)))
+
+
+async def _poll(bot: Bot, route: Callable[[dict[str, Any]], None], allowed_updates: list[str]) -> None:
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates, request_timeout=POLL_TIMEOUT + 10
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("getUpdates failed: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+def _webhook_app(route: Callable[[dict[str, Any]], None]) -> web.Application:
+    async def receive(request: web.Request) -> web.Response:
+        if settings.WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.WEBHOOK_SECRET:
+            return web.Response(status=401)
+        route(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, receive)
+    return app
+
+
+async def run_master(workers: int) -> None:
+    ctx = mp.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    events = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker_main, args=(i, workers, inboxes[i], events), name=f"worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    relay = asyncio.create_task(_relay(events, inboxes))
+
+    def route(update: dict[str, Any]) -> None:
+        inboxes[partition(update, workers)].put(("update", update))
+
+    bot = build_bot()
+    allowed_updates = build_dispatcher().resolve_used_update_types()
+    log.info("Receiving updates for %d workers", workers)
+    try:
+        if settings.RUN_MODE == "webhook":
+            await serve_webhook(_webhook_app(route), bot, allowed_updates)
+        else:
+            await bot.delete_webhook()
+            await _poll(bot, route, allowed_updates)
+    finally:
+        for inbox in inboxes:
+            inbox.put(SHUTDOWN)
+        loop = asyncio.get_running_loop()
+        for p in procs:
+            await loop.run_in_executor(None, p.join, settings.WEBHOOK_DRAIN_TIMEOUT + 5)
+            if p.is_alive():
+                log.warning("%s did not stop in time; terminating", p.name)
+                p.terminate()
+        events.put(SHUTDOWN)
+        await relay
+        await bot.session.close()
@@ -0,0 +1,105 @@
+"""A stand-in Telegram Bot API server for load tests.
+
+Answers every method with a plausible ``ok`` result and enforces Telegram-like flood
+limits (global and per-chat messages per second) by replying 429 with ``retry_after``.
+
+    python -m bench.fake_bot_api --port 8081 --global-rate 30 --chat-rate 1
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python run.py
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+SEND_METHODS = {"sendmessage", "editmessagetext", "senddocument"}
+
+
+class FakeBotAPI:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, retry_after: int = 1):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        self.calls: Counter[str] = Counter()
+        self.rejected = 0
+        self.sent: list[tuple[int, str]] = []
+        self.last_call = 0.0
+        self._window: dict[object, list[float]] = defaultdict(list)
+
+    def _over_limit(self, key: object, rate: float, now: float) -> bool:
+        if rate <= 0:
+            return False
+        hits = self._window[key]
+        while hits and hits[0] <= now - 1:
+            hits.pop(0)
+        if len(hits) >= math.ceil(rate):
+            return True
+        hits.append(now)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        self.calls[method] += 1
+        self.last_call = time.monotonic()
+        if method == "getupdates":
+            await asyncio.sleep(1)
+
+        if method in SEND_METHODS:
+            now = time.monotonic()
+            chat_id = data.get("chat_id")
+            if self._over_limit("global", self.global_rate, now) or self._over_limit(chat_id, self.chat_rate, now):
+                self.rejected += 1
+                return web.json_response({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                })
+            self.sent.append((int(chat_id), str(data.get("text", ""))))
+
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    def _result(self, method: str, data: dict) -> object:
+        now = int(time.time())
+        if method == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("sendmessage", "editmessagetext"):
+            chat_id = int(data.get("chat_id") or 0)
+            return {
+                "message_id": sum(self.calls.values()),
+                "date": now,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        if method == "getupdates":
+            return []
+        return True
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    api = FakeBotAPI(args.global_rate, args.chat_rate, args.retry_after)
+    web.run_app(api.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
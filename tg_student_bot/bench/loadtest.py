@@ -0,0 +1,475 @@
+"""Registration-day load test against a local fake Bot API.
+
+Builds the real dispatcher from ``app.main`` on a throwaway database and a synthetic
+registry/grades directory, then replays scripted traffic from ``--users`` simulated
+students (``/start``, student id, confirm, ``/grades``, course button, ``/mygrades``)
+plus an owner paging through the admin panel, at ``--rate`` updates per second. The owner
+is linked directly in the database before the timed traffic starts.
+
+    python -m bench.loadtest --users 2000 --rate 200 > before.json
+    python -m bench.loadtest --users 2000 --rate 200 --mode webhook > after.json
+    python -m bench.loadtest --users 2000 --rate 1000 --mode workers --workers 4
+
+``--mode workers`` starts the multi-process receiver (``WORKERS``) in webhook mode; per-update
+latency and query counts live in the worker processes, so only throughput (until the
+fake API goes quiet) and API call counts are reported.
+
+Prints JSON: throughput, p50/p95/p99 handler latency and DB queries per update, per
+router. ``--mode feed`` goes through a ``ChatExecutor`` as polling does, and latency runs
+from handing the update to the executor to the end of its job, so per-chat queueing is
+included. ``--mode webhook`` feeds updates directly, as the webhook handler does, and
+latency is measured around ``Dispatcher.feed_update``; neither counts the HTTP round trip.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+OWNER_ID = 1
+OWNER_STUDENT_ID = "40000000000"
+USER_SCRIPT = ("start", "student_id", "confirm", "grades", "course", "mygrades")
+ADMIN_SCRIPT = ("/admin", "Students", "Next", "Next", "Prev", "Back")
+ROUTERS = {
+    "start": "registration", "student_id": "registration", "confirm": "registration",
+    "grades": "grades", "course": "grades", "mygrades": "grades",
+    "admin": "admin",
+}
+
+_update_id: contextvars.ContextVar[int] = contextvars.ContextVar("loadtest_update_id")
+_queries: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("loadtest_queries", default=None)
+
+
+def _student_id(n: int) -> str:
+    return f"4{n:010d}"
+
+
+def write_dataset(root: Path, users: int, courses: int) -> list[str]:
+    (root / "data/registry").mkdir(parents=True)
+    (root / "data/grades").mkdir(parents=True)
+    with (root / "data/registry/students.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["student_id", "first_name", "last_name"])
+        w.writerow([OWNER_STUDENT_ID, "Owner", "Admin"])
+        for n in range(1, users + 1):
+            w.writerow([_student_id(n), f"First{n}", f"Last{n % 997}"])
+
+    names = [f"course{c}" for c in range(1, courses + 1)]
+    for c, course in enumerate(names):
+        with (root / f"data/grades/{course}.csv").open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["student_id", "midterm", "final", "total"])
+            for n in range(1, users + 1):
+                mid, fin = (n * 7 + c) % 10, (n * 13 + c) % 10
+                w.writerow([_student_id(n), mid, fin, mid + fin])
+    return names
+
+
+def _message(update_id: int, user_id: int, text: str) -> dict[str, Any]:
+    msg: dict[str, Any] = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def _callback(update_id: int, user_id: int, data: str) -> dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 0, "is_bot": True, "first_name": "bot"},
+                "text": "-",
+            },
+        },
+    }
+
+
+def build_traffic(users: int, courses: list[str], admin_every: int) -> list[tuple[str, dict[str, Any]]]:
+    """Scripted updates as (step, raw update); each user's steps are a full wave apart."""
+    traffic: list[tuple[str, dict[str, Any]]] = []
+    ids = iter(range(1, 10**9))
+
+    admin_steps = 0
+    for step in USER_SCRIPT:
+        for n in range(1, users + 1):
+            user_id = 100_000 + n
+            if step == "start":
+                update = _message(next(ids), user_id, "/start")
+            elif step == "student_id":
+                update = _message(next(ids), user_id, _student_id(n))
+            elif step == "confirm":
+                update = _callback(next(ids), user_id, "reg:confirm_yes")
+            elif step == "grades":
+                update = _message(next(ids), user_id, "/grades")
+            elif step == "course":
+                update = _callback(next(ids), user_id, f"grade:{courses[n % len(courses)]}")
+            else:
+                update = _message(next(ids), user_id, "/mygrades")
+            traffic.append((step, update))
+
+            if admin_every and len(traffic) % admin_every == 0:
+                text = ADMIN_SCRIPT[admin_steps % len(ADMIN_SCRIPT)]
+                traffic.append(("admin", _message(next(ids), OWNER_ID, text)))
+                admin_steps += 1
+    return traffic
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def rank(p: float) -> float:
+        return values[min(len(values) - 1, max(0, round(p * len(values)) - 1))]
+
+    return {
+        "count": len(values),
+        "p50": round(rank(0.50), 3),
+        "p95": round(rank(0.95), 3),
+        "p99": round(rank(0.99), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+async def link_owner() -> None:
+    """Register the owner up front, so admin updates in the timed traffic hit the admin panel."""
+    from app.db.repo import LinkRepo
+    from app.db.session import SessionLocal
+
+    async with SessionLocal() as session:
+        if await LinkRepo(session).get_link_by_telegram(OWNER_ID) is None:
+            await LinkRepo(session).create_link(OWNER_ID, OWNER_STUDENT_ID)
+    await check_owner()
+
+
+async def check_owner() -> None:
+    from app.db.repo import LinkRepo
+    from app.db.session import SessionLocal
+
+    async with SessionLocal() as session:
+        link = await LinkRepo(session).get_link_by_telegram(OWNER_ID)
+    if link is None or link.student_id != OWNER_STUDENT_ID:
+        raise SystemExit(f"owner {OWNER_ID} is not linked to {OWNER_STUDENT_ID}; admin numbers would be meaningless")
+
+
+async def run(args: argparse.Namespace, courses: list[str]) -> dict[str, Any]:
+    from aiohttp import ClientSession, web
+    from aiogram.types import Update
+    from sqlalchemy import event
+
+    from app.core.config import settings
+    from app.core.executor import ChatExecutor
+    from app.core.throttling import throttle_stats
+    from app.core.webhook import build_app
+    from app.db.grade_ingest import sync_grades
+    from app.db.registry_snapshot import load_registry_snapshot
+    from app.db.registry_sync import sync_registry
+    from app.db.session import engine, session_stats
+    from app.main import _init_db, build_bot, build_dispatcher
+    from bench.fake_bot_api import FakeBotAPI
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(*_: Any) -> None:
+        counter = _queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    await _init_db()
+    await sync_registry(force=True)
+    await sync_grades(force=True)
+    await load_registry_snapshot()  # sync only reloads it when it writes
+    await link_owner()
+
+    api = FakeBotAPI(global_rate=args.api_global_rate, chat_rate=args.api_chat_rate)
+    api_runner = web.AppRunner(api.app())
+    await api_runner.setup()
+    await web.TCPSite(api_runner, "127.0.0.1", args.api_port).start()
+
+    bot = build_bot()
+    executor = ChatExecutor(settings.POLL_CONCURRENCY, settings.CHAT_BACKLOG) if args.mode == "feed" else None
+    dp = build_dispatcher(executor=executor)
+
+    steps: dict[str, str] = {}
+    latency: dict[str, list[float]] = defaultdict(list)
+    queries: dict[str, list[int]] = defaultdict(list)
+    errors: Counter[str] = Counter()
+    pending: dict[int, asyncio.Future[None]] = {}
+
+    async def timed(update_id: int, started: float, call: Callable[[], Awaitable[Any]]) -> Any:
+        step = steps.get(update_id, "unknown")
+        counter = [0]
+        token = _queries.set(counter)
+        try:
+            return await call()
+        except Exception as e:
+            errors[type(e).__name__] += 1
+            raise
+        finally:
+            latency[step].append((time.perf_counter() - started) * 1000)
+            queries[step].append(counter[0])
+            _queries.reset(token)
+            done = pending.pop(update_id, None)
+            if done is not None and not done.done():
+                done.set_result(None)
+
+    if executor is None:
+        feed_update = dp.feed_update
+
+        async def timed_feed_update(bot: Any, update: Update, **kwargs: Any) -> Any:
+            return await timed(update.update_id, time.perf_counter(), lambda: feed_update(bot, update, **kwargs))
+
+        dp.feed_update = timed_feed_update
+    else:
+        # feed_update returns once the update is queued, so time the job the executor runs.
+        submit = executor.submit
+
+        def timed_submit(key: Any, job: Callable[[], Awaitable[Any]]) -> bool:
+            update_id, queued = _update_id.get(), time.perf_counter()
+            return submit(key, lambda: timed(update_id, queued, job))
+
+        executor.submit = timed_submit
+
+    traffic = build_traffic(args.users, courses, args.admin_every)
+    for step, raw in traffic:
+        steps[raw["update_id"]] = step
+
+    web_runner = None
+    http = None
+    if args.mode == "webhook":
+        web_runner = web.AppRunner(build_app(dp, bot))
+        await web_runner.setup()
+        await web.TCPSite(web_runner, "127.0.0.1", args.webhook_port).start()
+        http = ClientSession()
+        url = f"http://127.0.0.1:{args.webhook_port}{settings.WEBHOOK_PATH}"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": settings.WEBHOOK_SECRET} if settings.WEBHOOK_SECRET else {}
+
+    async def deliver(raw: dict[str, Any]) -> None:
+        if http is None:
+            _update_id.set(raw["update_id"])
+            try:
+                await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+            except Exception:
+                pass
+            return
+        done = pending[raw["update_id"]] = asyncio.get_running_loop().create_future()
+        async with http.post(url, json=raw, headers=headers) as resp:
+            if resp.status != 200:
+                errors[f"http_{resp.status}"] += 1
+                pending.pop(raw["update_id"], None)
+                return
+        await done
+
+    loop = asyncio.get_running_loop()
+    tasks = []
+    started = loop.time()
+    for i, (_, raw) in enumerate(traffic):
+        delay = started + i / args.rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(deliver(raw)))
+    await asyncio.gather(*tasks)
+    if executor is not None:
+        await executor.drain(timeout=300)
+    elapsed = loop.time() - started
+    await check_owner()
+
+    if http is not None:
+        await http.close()
+    if web_runner is not None:
+        await web_runner.cleanup()
+    await bot.session.close()
+    await api_runner.cleanup()
+    await engine.dispose()
+
+    by_router: dict[str, list[float]] = defaultdict(list)
+    queries_by_router: dict[str, list[int]] = defaultdict(list)
+    for step, values in latency.items():
+        by_router[ROUTERS.get(step, step)].extend(values)
+        queries_by_router[ROUTERS.get(step, step)].extend(queries[step])
+    all_latency = [v for values in latency.values() for v in values]
+    all_queries = [q for values in queries.values() for q in values]
+
+    def db(values: list[int]) -> dict[str, float]:
+        return {"mean": round(sum(values) / len(values), 3) if values else 0.0, "max": max(values, default=0)}
+
+    return {
+        "config": {
+            "mode": args.mode,
+            "users": args.users,
+            "rate": args.rate,
+            "courses": len(courses),
+            "admin_every": args.admin_every,
+            "db_url": settings.DB_URL,
+            "group_commit": settings.DB_GROUP_COMMIT,
+            "fsm_storage": settings.FSM_STORAGE,
+        },
+        "updates": len(traffic),
+        "processed": len(all_latency),
+        "errors": dict(errors),
+        "throttled": dict(throttle_stats),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ups": round(len(all_latency) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "all": percentiles(all_latency),
+            "routers": {name: percentiles(values) for name, values in sorted(by_router.items())},
+            "steps": {name: percentiles(values) for name, values in sorted(latency.items())},
+        },
+        "db_queries_per_update": {
+            "all": db(all_queries),
+            "routers": {name: db(values) for name, values in sorted(queries_by_router.items())},
+            "steps": {name: db(values) for name, values in sorted(queries.items())},
+        },
+        "db_sessions_opened": session_stats.opened,
+        "api_calls": dict(sorted(api.calls.items())),
+        "api_rejected": api.rejected,
+    }
+
+
+async def run_workers(args: argparse.Namespace, courses: list[str]) -> dict[str, Any]:
+    from aiohttp import ClientSession, web
+
+    from app.core.config import settings
+    from app.main import prepare
+    from app.workers import run_master
+    from bench.fake_bot_api import FakeBotAPI
+
+    await prepare()
+    await link_owner()
+    api = FakeBotAPI(global_rate=args.api_global_rate, chat_rate=args.api_chat_rate)
+    api_runner = web.AppRunner(api.app())
+    await api_runner.setup()
+    await web.TCPSite(api_runner, "127.0.0.1", args.api_port).start()
+
+    master = asyncio.create_task(run_master(args.workers))
+    await asyncio.sleep(args.warmup)
+    baseline = sum(api.calls.values())
+
+    traffic = build_traffic(args.users, courses, args.admin_every)
+    url = f"http://127.0.0.1:{args.webhook_port}{settings.WEBHOOK_PATH}"
+    errors: Counter[str] = Counter()
+    loop = asyncio.get_running_loop()
+    async with ClientSession() as http:
+        async def post(raw: dict[str, Any]) -> None:
+            async with http.post(url, json=raw) as resp:
+                if resp.status != 200:
+                    errors[f"http_{resp.status}"] += 1
+
+        tasks = []
+        started = loop.time()
+        for i, (_, raw) in enumerate(traffic):
+            delay = started + i / args.rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(post(raw)))
+        await asyncio.gather(*tasks)
+
+    # Done once the workers have stopped talking to the API for a while.
+    while time.monotonic() - api.last_call < args.quiet:
+        await asyncio.sleep(0.1)
+    elapsed = api.last_call - started  # both on the monotonic clock
+
+    master.cancel()
+    try:
+        await master
+    except asyncio.CancelledError:
+        pass
+    await api_runner.cleanup()
+    await check_owner()
+
+    return {
+        "config": {
+            "mode": args.mode,
+            "workers": args.workers,
+            "users": args.users,
+            "rate": args.rate,
+            "courses": len(courses),
+            "admin_every": args.admin_every,
+            "db_url": settings.DB_URL,
+        },
+        "updates": len(traffic),
+        "errors": dict(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ups": round(len(traffic) / elapsed, 1) if elapsed else 0.0,
+        "api_calls": sum(api.calls.values()) - baseline,
+        "api_rejected": api.rejected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200, help="updates per second")
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--admin-every", type=int, default=100, help="one admin update per N student updates (0: none)")
+    parser.add_argument("--mode", choices=("feed", "webhook", "workers"), default="feed")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes for --mode workers")
+    parser.add_argument("--warmup", type=float, default=8, help="seconds to let workers start (--mode workers)")
+    parser.add_argument("--quiet", type=float, default=2, help="API silence that ends a --mode workers run")
+    parser.add_argument("--db-url", default="", help="defaults to a SQLite file in a temp dir")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    parser.add_argument("--api-global-rate", type=float, default=0, help="fake API flood limit (0: off)")
+    parser.add_argument("--api-chat-rate", type=float, default=0)
+    parser.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        workdir = Path(tmp)
+        courses = write_dataset(workdir, args.users, args.courses)
+
+        # Settings are read at import time, so the environment is fixed before app.* is imported.
+        os.environ.update({
+            "BOT_TOKEN": "123456:loadtest",
+            "TELEGRAM_API_URL": f"http://127.0.0.1:{args.api_port}",
+            "DB_URL": args.db_url or f"sqlite+aiosqlite:///{workdir / 'bot.db'}",
+            "OWNER_STUDENT_ID": OWNER_STUDENT_ID,
+            "WEBHOOK_BASE_URL": "",
+        })
+        if args.mode == "workers":
+            os.environ.update({
+                "WORKERS": str(args.workers),
+                "RUN_MODE": "webhook",
+                "WEBAPP_HOST": "127.0.0.1",
+                "WEBAPP_PORT": str(args.webhook_port),
+                "WEBHOOK_SECRET": "",
+            })
+        sys.path.insert(0, str(ROOT))
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            report = asyncio.run((run_workers if args.mode == "workers" else run)(args, courses))
+        finally:
+            os.chdir(cwd)
+
+    out = json.dumps(report, indent=2, sort_keys=False)
+    if args.out:
+        Path(args.out).write_text(out + "\n", encoding="utf-8")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Memory and lookup cost of the registry snapshot, against the alternatives.
+
+Builds ``--students`` synthetic registry rows (distinct string objects, as rows read
+from the DB would be) and measures with tracemalloc what each in-memory form costs:
+ORM objects, the plain row tuples a query returns, the search index and the
+registration snapshot. Then times snapshot lookups for known, unknown and
+non-numeric ids, and search-index queries of each kind ``/find`` serves.
+
+    python -m bench.registry_memory --students 100000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+
+FIRST = ("علی", "محمد", "زهرا", "فاطمه", "حسین", "مریم", "رضا", "کوثر", "امیرحسین", "نرگس")
+LAST = ("محمدی", "حسینی", "احمدی", "رضایی", "کریمی", "موسوی", "جعفری", "صادقی", "قاسمی", "هاشمی")
+
+
+def _copy(s: str) -> str:
+    return (s + " ")[:-1]  # a new str object, like one decoded from a DB row
+
+
+def make_rows(n: int) -> list[tuple[str, str, str]]:
+    rng = random.Random(1)
+    ids = rng.sample(range(40_000_000_000, 41_000_000_000), n)
+    return [(str(sid), _copy(rng.choice(FIRST)), _copy(rng.choice(LAST))) for sid in ids]
+
+
+def measure(build: Callable[[], Any]) -> tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return obj, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("DB_URL", "sqlite+aiosqlite://")
+    sys.path.insert(0, str(ROOT))
+    from app.db.models import StudentRegistry
+    from app.db.registry_snapshot import RegistrySnapshot
+    from app.db.student_index import StudentIndex
+
+    rows = make_rows(args.students)
+    report: dict[str, Any] = {"students": args.students, "bytes": {}}
+
+    def fresh():
+        # Every structure gets its own strings, so what it keeps is what it costs.
+        return ((_copy(a), _copy(b), _copy(c)) for a, b, c in rows)
+
+    def snapshot() -> RegistrySnapshot:
+        s = RegistrySnapshot()
+        s.load(fresh())
+        return s
+
+    def index() -> StudentIndex:
+        i = StudentIndex()
+        i.load(fresh())
+        return i
+
+    builders = {
+        "orm_objects": lambda: [StudentRegistry(student_id=a, first_name=b, last_name=c) for a, b, c in fresh()],
+        "rows_as_tuples": lambda: list(fresh()),
+        "search_index": index,
+        "snapshot": snapshot,
+    }
+    built: dict[str, Any] = {}
+    for name, build in builders.items():
+        built[name], size = measure(build)
+        report["bytes"][name] = size
+    report["bytes_per_student"] = {k: round(v / args.students, 1) for k, v in report["bytes"].items()}
+
+    snap: RegistrySnapshot = built["snapshot"]
+    rng = random.Random(2)
+    known = [rng.choice(rows)[0] for _ in range(1000)]
+    unknown = [str(rng.randrange(41_000_000_000, 42_000_000_000)) for _ in range(1000)]
+    malformed = [f"0{sid}" for sid in known]
+    misses = sum(snap.get(sid) is not None for sid in unknown)
+    report["bloom_false_positives"] = f"{misses}/{len(unknown)}"
+
+    report["lookup_ns"] = {}
+    for name, ids in (("known", known), ("unknown", unknown), ("non_numeric", malformed)):
+        loops = max(1, args.lookups // len(ids))
+        seconds = timeit.timeit(lambda: [snap.get(sid) for sid in ids], number=loops)
+        report["lookup_ns"][name] = round(seconds / (loops * len(ids)) * 1e9)
+
+    search: StudentIndex = built["search_index"]
+    queries = {
+        "id_prefix": known[0][:4],
+        "id_substring": "0000",
+        "name": FIRST[1],
+        "two_words": f"{LAST[0]} {FIRST[0]}",
+        "no_match": "zzzz",
+    }
+    report["search_us"] = {}
+    for name, query in queries.items():
+        loops = max(1, args.lookups // 100)
+        seconds = timeit.timeit(lambda: search.search(query), number=loops)
+        report["search_us"][name] = round(seconds / loops * 1e6, 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# app.core.config reads these at import time.
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite://")
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.core import bus
+
+
+def test_every_subscriber_gets_the_event():
+    seen: list[tuple[str, object]] = []
+
+    async def reload(payload: object) -> None:
+        seen.append(("async", payload))
+
+    bus.subscribe("test-topic", lambda payload: seen.append(("sync", payload)))
+    bus.subscribe("test-topic", reload)
+    asyncio.run(bus.deliver("test-topic", 7))
+    assert seen == [("sync", 7), ("async", 7)]
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.csv_import import UploadError, _target
+from app.utils.csv_loader import GRADES_DIR, REGISTRY_PATH
+
+
+def test_targets():
+    assert _target("students.csv") == (REGISTRY_PATH, None)
+    assert _target("prosthesis.CSV") == (GRADES_DIR / "prosthesis.csv", "prosthesis")
+
+
+@pytest.mark.parametrize("name", ["notes.txt", ".hidden.csv", "a:b.csv", "آزمون عملی پروتز ثابت ترم دوم ۱۴۰۳.csv"])
+def test_rejected_names(name):
+    with pytest.raises(UploadError):
+        _target(name)
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from app.utils import csv_loader
+from app.utils.persian import normalize_student_id
+
+
+def test_normalize_student_id():
+    assert normalize_student_id(" ۴۰۲۱۱۲۷۲۰۰۳ ") == "40211272003"
+    assert normalize_student_id("‏٤٠٢١١ 272003‎") == "40211272003"
+
+
+def test_grade_file_ids_are_normalized(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_loader, "GRADES_DIR", tmp_path)
+    (tmp_path / "c.csv").write_text(
+        "student_id,final\n ۴۰۲۱۱۲۷۲۰۰۳ ,18\n40211272003,12\n‎40100000001,15\n", encoding="utf-8"
+    )
+    table = csv_loader._read_grade_table("c")
+    assert table.rows == {"40211272003": ["18"], "40100000001": ["15"]}
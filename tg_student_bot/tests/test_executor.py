@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import CallbackQuery, Message, Update
+
+from app.core.executor import ChatExecutor, ChatOrderMiddleware
+
+USER = 42
+
+
+class Reg(StatesGroup):
+    waiting_id = State()
+    waiting_confirm = State()
+
+
+def _message(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": USER, "type": "private"},
+            "from": {"id": USER, "is_bot": False, "first_name": "u"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]} if text.startswith("/") else {}),
+        },
+    })
+
+
+def _callback(update_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": "1",
+            "from": {"id": USER, "is_bot": False, "first_name": "u"},
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": USER, "type": "private"},
+                "text": "x",
+            },
+        },
+    })
+
+
+def _dispatcher(handled: list[str]) -> tuple[Dispatcher, ChatExecutor]:
+    executor = ChatExecutor(concurrency=4, backlog=10)
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.update.outer_middleware(ChatOrderMiddleware(executor))
+    router = Router()
+
+    @router.message(Command("start"))
+    async def start(message: Message, state: FSMContext) -> None:
+        await asyncio.sleep(0.01)  # a slow handler, so later updates queue up behind it
+        await state.set_state(Reg.waiting_id)
+        handled.append("start")
+
+    @router.message(Reg.waiting_id)
+    async def on_id(message: Message, state: FSMContext) -> None:
+        await state.set_state(Reg.waiting_confirm)
+        handled.append(f"id {message.text}")
+
+    @router.callback_query(F.data == "yes", Reg.waiting_confirm)
+    async def confirm(call: CallbackQuery, state: FSMContext) -> None:
+        await state.clear()
+        handled.append("confirm")
+
+    @router.callback_query()
+    async def stale(call: CallbackQuery) -> None:
+        handled.append("stale")
+
+    dp.include_router(router)
+    return dp, executor
+
+
+def _feed(updates: list[Update]) -> list[str]:
+    handled: list[str] = []
+
+    async def run() -> None:
+        dp, executor = _dispatcher(handled)
+        bot = Bot("1:test")
+        try:
+            # Back to back, as polling with handle_as_tasks=False hands them over.
+            for update in updates:
+                await dp.feed_update(bot, update)
+            await executor.drain(5)
+        finally:
+            await bot.session.close()
+
+    asyncio.run(run())
+    return handled
+
+
+def test_state_set_by_a_queued_update_is_seen_by_the_next():
+    handled = _feed([_message(1, "/start"), _message(2, "40211272003"), _callback(3, "yes")])
+    assert handled == ["start", "id 40211272003", "confirm"]
+
+
+def test_double_tap_passes_the_state_filter_once():
+    handled = _feed([_message(1, "/start"), _message(2, "40211272003"), _callback(3, "yes"), _callback(4, "yes")])
+    assert handled == ["start", "id 40211272003", "confirm", "stale"]
+
+
+def test_callback_dropped_for_a_full_backlog_is_answered():
+    answered: list[str] = []
+
+    async def run() -> None:
+        executor = ChatExecutor(concurrency=1, backlog=0)
+        middleware = ChatOrderMiddleware(executor)
+        release = asyncio.Event()
+
+        class _Bot:
+            async def answer_callback_query(self, callback_query_id: str, text: str | None = None) -> bool:
+                answered.append(callback_query_id)
+                return True
+
+        async def handler(event: object, data: dict) -> None:
+            await release.wait()
+
+        for update in (_callback(1, "yes"), _callback(2, "yes")):
+            chat = update.callback_query.message.chat
+            await middleware(handler, update, {"bot": _Bot(), "event_chat": chat})
+        release.set()
+        await executor.drain(5)
+
+    asyncio.run(run())
+    assert answered == ["2"]
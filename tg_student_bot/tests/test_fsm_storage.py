@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.fsm_storage import SQLStorage
+from app.db.migrations import migrate
+from app.db.models import FsmState
+from app.db.session import LazySession, current_session
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+def _engine(tmp_path: Path):
+    # One connection in total: a second checkout would time out.
+    return create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}", pool_size=1, max_overflow=0, pool_timeout=0.5
+    )
+
+
+def test_clear_in_a_batch_is_one_commit(tmp_path):
+    async def run() -> tuple[int, int]:
+        engine = _engine(tmp_path)
+        await migrate(engine)
+        storage = SQLStorage(engine, ttl=3600)
+        ctx = FSMContext(storage, KEY)
+        await ctx.set_state("s:one")
+        await ctx.update_data(a=1, b=2)
+
+        commits = 0
+
+        def count(_conn) -> None:
+            nonlocal commits
+            commits += 1
+
+        event.listen(engine.sync_engine, "commit", count)
+        async with storage.batch():
+            await ctx.clear()
+        async with engine.connect() as conn:
+            rows = await conn.scalar(select(func.count()).select_from(FsmState))
+        await engine.dispose()
+        return commits, rows
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_uses_the_update_session_connection(tmp_path):
+    async def run() -> str | None:
+        engine = _engine(tmp_path)
+        await migrate(engine)
+        storage = SQLStorage(engine, ttl=3600)
+        session = LazySession(async_sessionmaker(bind=engine, expire_on_commit=False))
+        token = current_session.set(session)
+        try:
+            await session.execute(select(1))  # the handler already holds the only connection
+            async with storage.batch():
+                await storage.set_state(KEY, "s:two")
+                await storage.update_data(KEY, {"page": 3})
+            storage._cache.clear()
+            return await storage.get_state(KEY)
+        finally:
+            current_session.reset(token)
+            await session.close()
+            await engine.dispose()
+
+    assert asyncio.run(run()) == "s:two"
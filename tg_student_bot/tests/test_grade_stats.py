@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.services.grade_stats import course_stats, full_mark
+
+
+class _Repo:
+    def __init__(self, columns: list[str], cells: list[tuple[int, str]]):
+        self.columns, self.cells = columns, cells
+
+    async def course_hash(self, course: str) -> str:
+        return f"{course}-{len(self.cells)}"
+
+    async def course_values(self, course: str) -> tuple[list[str], list[tuple[int, str]]]:
+        return self.columns, self.cells
+
+
+def _stats(columns: list[str], cells: list[tuple[int, str]], course: str = "c"):
+    return asyncio.run(course_stats(_Repo(columns, cells), course))
+
+
+def test_full_mark_from_header_or_scale():
+    assert full_mark("final (100)") == 100
+    assert full_mark("midterm/15") == 15
+    assert full_mark("final") == 20
+
+
+def test_pass_rate_uses_the_full_mark_not_the_top_score():
+    # A weak class: nobody reaches half of 20, though all are above half the top score.
+    stats = _stats(["final", "project (100)", "notes"], [
+        (0, "6"), (0, "7"), (0, "9.5"), (0, "10"),
+        (1, "40"), (1, "55"), (1, "90"),
+        (2, "absent"),
+    ], course="weak")
+    final, project = stats.columns
+    assert [c.name for c in stats.columns] == ["final", "project (100)"]
+    assert final.pass_mark == 10 and final.pass_rate == 0.25
+    assert project.pass_mark == 50 and round(project.pass_rate, 3) == 0.667
+    assert final.median == 8.25 and final.mean == 8.125
+    assert final.rank(10) == 1 and final.rank(7) == 3
+    assert sum(n for _, _, n in final.histogram()) == 4
+
+
+def test_full_mark_in_persian_words():
+    assert full_mark("نمرات چینش دندان های قدامی(از پنج نمره)") == 5
+    assert full_mark("مجموع (از دوازده نمره)") == 12
+    assert full_mark("پایانی (از ۲۵ نمره)") == 25
+    assert full_mark("کل (از بیست و پنج نمره)") == 25
+    assert full_mark("گروه (الف)") == 20
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from sqlalchemy import Connection, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.db.base import Base
+from app.db.migrations import MIGRATIONS, migrate
+
+
+def _schema(conn: Connection) -> dict[str, tuple[list[tuple[str, str, bool]], set[str]]]:
+    insp = inspect(conn)
+    return {
+        table: (
+            [(c["name"], str(c["type"]), c["nullable"]) for c in insp.get_columns(table)],
+            {i["name"] for i in insp.get_indexes(table)},
+        )
+        for table in insp.get_table_names()
+    }
+
+
+def _migrated_schema(tmp_path: Path, before: str = "") -> tuple[int, dict]:
+    async def run() -> tuple[int, dict]:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+        try:
+            if before:
+                async with engine.begin() as conn:
+                    for stmt in before.split(";"):
+                        await conn.execute(text(stmt))
+            version = await migrate(engine)
+            async with engine.connect() as conn:
+                return version, await conn.run_sync(_schema)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def _model_schema(tmp_path: Path) -> dict:
+    async def run() -> dict:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'models.db'}")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                return await conn.run_sync(_schema)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_migrations_build_the_schema_the_models_describe(tmp_path):
+    # Fails when a model changes without a migration step that makes the same change.
+    version, schema = _migrated_schema(tmp_path)
+    assert version == len(MIGRATIONS)
+    assert schema == _model_schema(tmp_path)
+
+
+def test_database_from_before_versioning_gets_the_indexes(tmp_path):
+    before = """
+        CREATE TABLE student_registry (
+            student_id VARCHAR(32) PRIMARY KEY, first_name VARCHAR(128) NOT NULL, last_name VARCHAR(128) NOT NULL,
+            created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+        );
+        INSERT INTO student_registry (student_id, first_name, last_name) VALUES ('40211272003', 'a', 'b')
+    """
+    version, schema = _migrated_schema(tmp_path, before)
+    assert version == len(MIGRATIONS)
+    assert "ix_student_registry_order" in schema["student_registry"][1]
+    assert set(schema) == set(_model_schema(tmp_path))
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from app.db.student_index import StudentIndex
+
+
+def _index() -> StudentIndex:
+    index = StudentIndex()
+    index.load([
+        ("40211272003", "علی", "محمدی"),
+        ("40100004321", "زهرا", "احمدی"),
+        ("40300001234", "علي", "رضایی"),  # Arabic yeh
+    ])
+    return index
+
+
+def _ids(hits) -> list[str]:
+    return [h.student_id for h in hits]
+
+
+def test_prefix_substring_and_multi_word():
+    index = _index()
+    assert _ids(index.search("4021")) == ["40211272003"]
+    assert sorted(_ids(index.search("0000"))) == ["40100004321", "40300001234"]
+    assert sorted(_ids(index.search("علی"))) == ["40211272003", "40300001234"]
+    assert _ids(index.search("حمدی علی")) == ["40211272003"]
+    assert index.search("۴۰۱۰۰") == index.search("40100")
+    assert index.search("zzz") == []
+
+
+def test_limit_and_prefix_matches_first():
+    index = _index()
+    assert len(index.search("00", limit=1)) <= 1
+    assert _ids(index.search("403", limit=3))[0] == "40300001234"
+
+
+def test_put_and_remove_keep_postings_in_step():
+    index = _index()
+    index.put("40211272003", "کوثر", "قاسمی")
+    assert index.search("محمدی") == []
+    assert _ids(index.search("قاسم")) == ["40211272003"]
+    index.remove("40100004321")
+    index.put("40500009999", "نرگس", "هاشمی")
+    assert len(index) == 3
+    assert sorted(_ids(index.search("0000"))) == ["40300001234", "40500009999"]
+    assert _ids(index.search("رگس")) == ["40500009999"]
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+
+from aiogram.types import CallbackQuery, Update, User
+
+from app.core.throttling import ThrottlingMiddleware
+
+USER = {"id": 42, "is_bot": False, "first_name": "u"}
+
+
+class _Bot:
+    def __init__(self) -> None:
+        self.answered: list[str] = []
+
+    async def answer_callback_query(self, callback_query_id: str, text: str | None = None) -> bool:
+        self.answered.append(callback_query_id)
+        return True
+
+
+def _call(n: int) -> CallbackQuery:
+    return CallbackQuery.model_validate({"id": str(n), "chat_instance": "1", "from": USER, "data": "x"})
+
+
+def _press(middleware: ThrottlingMiddleware, bot: _Bot, event: object) -> object:
+    async def handler(event: object, data: dict) -> str:
+        return "handled"
+
+    data = {"bot": bot, "event_from_user": User.model_validate(USER)}
+    return asyncio.run(middleware(handler, event, data))
+
+
+def test_throttled_callback_query_is_answered():
+    middleware = ThrottlingMiddleware("test", rate=0.001, burst=1)
+    bot = _Bot()
+    assert _press(middleware, bot, _call(1)) == "handled"
+    assert _press(middleware, bot, _call(2)) is None
+    assert bot.answered == ["2"]
+
+
+def test_throttled_update_with_callback_query_is_answered():
+    middleware = ThrottlingMiddleware("test", rate=0.001, burst=1)
+    bot = _Bot()
+    updates = [Update(update_id=n, callback_query=_call(n)) for n in (1, 2)]
+    assert [_press(middleware, bot, u) for u in updates] == ["handled", None]
+    assert bot.answered == ["2"]
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.core import metrics
+from app.db.write_queue import WriteQueue
+
+
+class _Session:
+    async def __aenter__(self) -> "_Session":
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        pass
+
+    async def commit(self) -> None:
+        pass
+
+
+def test_writer_task_does_not_inherit_the_update_scope():
+    async def run() -> object:
+        queue = WriteQueue(_Session, max_delay=0.001, max_batch=8)
+        token = metrics._scope.set(metrics._UpdateScope(update_id=1))
+        try:
+            async def op(session: _Session) -> object:
+                return metrics._scope.get()
+
+            return await queue.submit(op)
+        finally:
+            metrics._scope.reset(token)
+
+    assert asyncio.run(run()) is None